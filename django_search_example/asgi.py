@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_search_example.settings")
+# Persistent connections are kept per thread, and each request runs its database queries in a new thread.
+os.environ.setdefault("GUTENSEARCH_CONN_MAX_AGE", "0")
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 DEMO_PASSWORD = "deMo.123"
@@ -24,9 +25,11 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = "django-insecure"
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# For benchmarks, turn it off using the environment variable GUTENSEARCH_DEBUG=0.
+DEBUG = os.environ.get("GUTENSEARCH_DEBUG", "1") != "0"
 
-ALLOWED_HOSTS = []
+# Like with DEBUG, only accept requests to the local host.
+ALLOWED_HOSTS = ["localhost", "127.0.0.1", "[::1]"]
 
 
 # Application definition
@@ -40,19 +43,18 @@ INSTALLED_APPS = [
     "django.contrib.postgres",
     "django.contrib.staticfiles",
     "django_extensions",
-    "debug_toolbar",
     "gutensearch.apps.GutenSearchConfig",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "gutensearch.instrumentation.QueryMetricsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
 ROOT_URLCONF = "django_search_example.urls"
@@ -88,9 +90,53 @@ DATABASES = {
         "PASSWORD": DEMO_PASSWORD,
         "HOST": "localhost",
         "PORT": 5678,
+        # Keep connections open between requests instead of connecting for each request, and check
+        # before reusing them. Under ASGI, each request gets a new thread and consequently a new
+        # connection, which would stay open for nothing, so asgi.py sets GUTENSEARCH_CONN_MAX_AGE to 0.
+        # To reuse connections there, use a pool like PgBouncer in front of the database.
+        "CONN_MAX_AGE": int(os.environ.get("GUTENSEARCH_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Read only replicas of the default database, for example PostgreSQL streaming replicas, from which
+# the search result, suggestion and document views read. Imports and the admin always use the default
+# database. To add a replica, use for example:
+#
+#     DATABASES["replica"] = {
+#         **DATABASES["default"],
+#         "HOST": "replica.example.com",
+#         # Tests use the default database for the replica.
+#         "TEST": {"MIRROR": "default"},
+#     }
+#     GUTENSEARCH_REPLICA_DATABASES = ["replica"]
+GUTENSEARCH_REPLICA_DATABASES = []
+
+# Time in seconds a replica that could not be connected to is skipped before it is tried again.
+GUTENSEARCH_REPLICA_RETRY_IN_SECONDS = 30
+
+DATABASE_ROUTERS = ["gutensearch.routers.ReplicaRouter"]
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+# Search results are cached per process with the least recently used entries being culled once
+# MAX_ENTRIES is reached. To share them between processes, use for example
+# "django.core.cache.backends.filebased.FileBasedCache" with a LOCATION directory instead.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "search_results": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "search_results",
+        "TIMEOUT": 15 * 60,
+        "OPTIONS": {
+            "MAX_ENTRIES": 1000,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -138,3 +184,35 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
+if DEBUG:
+    INSTALLED_APPS.append("debug_toolbar")
+    MIDDLEWARE.append("debug_toolbar.middleware.DebugToolbarMiddleware")
+
+# Gutensearch
+# Default search mode: "fulltext" uses the stored search vectors, "trigram"
+# finds substrings of and similar titles and authors.
+GUTENSEARCH_SEARCH_MODE = "fulltext"
+
+# Show an approximate number of matching documents on the search result page.
+GUTENSEARCH_SHOW_RESULT_COUNT = True
+
+# Time in milliseconds computing the number of matching documents per language and author may take
+# before the search result page is shown without these facets.
+GUTENSEARCH_FACET_TIMEOUT_IN_MS = 200
+
+# Cache the suggestions for the search term in the "search_results" cache.
+GUTENSEARCH_CACHE_SUGGESTIONS = True
+
+# Searches taking at least this many milliseconds are logged together with the plan of their slowest
+# query, which is obtained using EXPLAIN (ANALYZE, BUFFERS) and consequently runs the query again.
+GUTENSEARCH_SLOW_SEARCH_THRESHOLD_IN_MS = 500
+
+# Number of most recent slow searches to keep for /metrics/slow-searches/.
+GUTENSEARCH_SLOW_SEARCH_LOG_SIZE = 100
+
+# Client addresses that may read the metrics at /metrics/ and /metrics/slow-searches/.
+GUTENSEARCH_METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
+# Bearer token clients have to send to read the metrics, which include search terms and query plans.
+# Without a token, the metrics are disabled.
+GUTENSEARCH_METRICS_TOKEN = os.environ.get("GUTENSEARCH_METRICS_TOKEN")
@@ -1,12 +1,36 @@
 from django.contrib import admin
 
-from gutensearch.models import Document
+from gutensearch.models import Document, Passage
+from gutensearch.pagination import EstimatedCountPaginator
+from gutensearch.result_cache import bump_index_generation
+from gutensearch.search import documents_matching, update_search_vectors
 
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
-    fields = ("title", "language_code", "authors", "text", "html")
+    fields = ("title", "language_code", "authors")
     list_display = ("title", "authors", "language_code")
     list_display_links = ("title",)
     list_filter = ("language_code",)
-    search_fields = ("title", "authors", "text")
+    paginator = EstimatedCountPaginator
+    # Searches use the indexes of documents_matching() instead of these fields, see get_search_results().
+    search_fields = ("title", "authors")
+    # Counting all documents once more for "show all" takes too long for large tables.
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer("search_vector")
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Keep the passages and search vectors in sync with the edited document, and make cached search
+        # results with its previous title, authors or language unreachable.
+        Passage.objects.filter(document_id=obj.id).update(language_code=obj.language_code)
+        update_search_vectors([obj.id])
+        bump_index_generation()
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        matching_document_ids = documents_matching(search_term).values("id")
+        return queryset.filter(id__in=matching_document_ids), False
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class GutenSearchConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "gutensearch"
+
+    def ready(self):
+        from gutensearch.instrumentation import install_query_recorder
+
+        connection_created.connect(install_query_recorder, dispatch_uid="gutensearch_query_recorder")
@@ -0,0 +1,299 @@
+"""
+Benchmark for the search strategies using a synthetic corpus.
+
+The corpus resembles Project Gutenberg documents: each language has its own vocabulary of pseudo words
+whose frequencies follow Zipf's law, and so do the authors. Queries are drawn from the same distribution,
+so a few terms are searched for very often while most are rare, like in a real query log.
+"""
+import json
+import random
+import statistics
+import time
+import zlib
+from itertools import accumulate
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from django.db import connection
+
+from gutensearch.gutenberg import HTML_COMPRESSION_LEVEL, passage_ends, passages_from
+from gutensearch.loaders import BulkCreateLoader, truncate
+from gutensearch.models import Document, DocumentHtml, Passage
+from gutensearch.pagination import keyset_page
+from gutensearch.result_cache import bump_index_generation
+from gutensearch.search import SearchMode, documents_matching, snippets_for, update_search_vectors
+
+DEFAULT_DOCUMENT_COUNT = 1000
+DEFAULT_LANGUAGE_MIX = {"en": 0.6, "de": 0.2, "fr": 0.1, "es": 0.1}
+DEFAULT_QUERY_COUNT = 500
+DEFAULT_EXPLAIN_COUNT = 20
+DEFAULT_SEED = 1
+DEFAULT_WORDS_PER_DOCUMENT = 5000
+DEFAULT_ZIPF_EXPONENT = 1.1
+
+PAGE_SIZE = 20
+
+_AUTHOR_COUNT = 200
+_BATCH_SIZE = 100
+_VOCABULARY_SIZE = 5000
+_WORDS_PER_LINE = 12
+_LINES_PER_PARAGRAPH = 8
+_CONSONANTS = "bcdfghklmnprstvwz"
+_VOWELS = "aeiou"
+# Share of queries searching only in the language of the term and with two words.
+_LANGUAGE_QUERY_SHARE = 0.5
+_TWO_WORD_QUERY_SHARE = 0.3
+
+
+class SyntheticCorpus(NamedTuple):
+    document_count: int
+    passage_count: int
+    language_mix: Dict[str, float]
+    language_code_to_vocabulary_map: Dict[str, List[str]]
+    seed: int
+    zipf_exponent: float
+
+
+class BenchmarkQuery(NamedTuple):
+    search_term: str
+    language_code: Optional[str]
+
+
+def language_mix_from(text: str) -> Dict[str, float]:
+    """
+    Share of each language from a comma separated list like "en=0.7,de=0.3". The shares are normalized
+    so they add up to 1.
+    """
+    result = {}
+    for item in text.split(","):
+        language_code, _, share = item.partition("=")
+        language_code = language_code.strip()
+        if len(language_code) != 2:
+            raise ValueError(f"language code must have 2 letters: {language_code!r}")
+        result[language_code] = float(share) if share.strip() else 1.0
+    total_share = sum(result.values())
+    if total_share <= 0:
+        raise ValueError(f"sum of language shares must be positive: {text!r}")
+    return {language_code: share / total_share for language_code, share in result.items()}
+
+
+def generate_corpus(
+    document_count: int = DEFAULT_DOCUMENT_COUNT,
+    language_mix: Optional[Dict[str, float]] = None,
+    words_per_document: int = DEFAULT_WORDS_PER_DOCUMENT,
+    zipf_exponent: float = DEFAULT_ZIPF_EXPONENT,
+    seed: int = DEFAULT_SEED,
+) -> SyntheticCorpus:
+    """
+    Replace all documents by ``document_count`` synthetic ones with languages according to
+    ``language_mix`` and compute their search vectors and table statistics.
+    """
+    if language_mix is None:
+        language_mix = DEFAULT_LANGUAGE_MIX
+    randomizer = random.Random(seed)
+    language_codes = list(language_mix.keys())
+    language_code_to_vocabulary_map = {
+        language_code: _vocabulary(random.Random(f"{seed}-{language_code}")) for language_code in language_codes
+    }
+    zipf_cumulative_weights = _zipf_cumulative_weights(_VOCABULARY_SIZE, zipf_exponent)
+    authors = [_author(randomizer) for _ in range(_AUTHOR_COUNT)]
+    author_cumulative_weights = _zipf_cumulative_weights(_AUTHOR_COUNT, zipf_exponent)
+
+    truncate([DocumentHtml, Passage, Document])
+    document_loader = BulkCreateLoader(Document)
+    document_html_loader = BulkCreateLoader(DocumentHtml)
+    passage_loader = BulkCreateLoader(Passage)
+    passage_count = 0
+    for batch_start in range(0, document_count, _BATCH_SIZE):
+        documents = []
+        document_htmls = []
+        passages = []
+        for document_id in range(batch_start + 1, min(batch_start + _BATCH_SIZE, document_count) + 1):
+            language_code = randomizer.choices(language_codes, weights=list(language_mix.values()))[0]
+            vocabulary = language_code_to_vocabulary_map[language_code]
+            title = " ".join(
+                randomizer.choices(vocabulary, cum_weights=zipf_cumulative_weights, k=randomizer.randint(2, 6))
+            ).title()
+            text = "".join(_text_lines(randomizer, vocabulary, zipf_cumulative_weights, words_per_document))
+            documents.append(
+                Document(
+                    id=document_id,
+                    title=title,
+                    language_code=language_code,
+                    authors=randomizer.choices(authors, cum_weights=author_cumulative_weights)[0],
+                )
+            )
+            html = f"<html><body><h1>{title}</h1><pre>{text}</pre></body></html>"
+            document_htmls.append(
+                DocumentHtml(
+                    document_id=document_id,
+                    compressed_html=zlib.compress(html.encode("utf-8"), HTML_COMPRESSION_LEVEL),
+                )
+            )
+            for ordinal, passage_text in enumerate(passages_from(text, passage_ends(text))):
+                passages.append(
+                    Passage(document_id=document_id, ordinal=ordinal, language_code=language_code, text=passage_text)
+                )
+        document_loader.load(documents)
+        document_html_loader.load(document_htmls)
+        passage_loader.load(passages)
+        update_search_vectors(document.id for document in documents)
+        passage_count += len(passages)
+    with connection.cursor() as cursor:
+        for model in (Document, DocumentHtml, Passage):
+            cursor.execute(f"analyze {connection.ops.quote_name(model._meta.db_table)}")
+    bump_index_generation()
+    return SyntheticCorpus(
+        document_count, passage_count, dict(language_mix), language_code_to_vocabulary_map, seed, zipf_exponent
+    )
+
+
+def zipf_queries(corpus: SyntheticCorpus, query_count: int = DEFAULT_QUERY_COUNT) -> List[BenchmarkQuery]:
+    """
+    Queries for words of the ``corpus`` drawn with the same Zipf distribution the texts use.
+    """
+    randomizer = random.Random(f"{corpus.seed}-queries")
+    language_codes = list(corpus.language_mix.keys())
+    zipf_cumulative_weights = _zipf_cumulative_weights(_VOCABULARY_SIZE, corpus.zipf_exponent)
+    result = []
+    for _ in range(query_count):
+        language_code = randomizer.choices(language_codes, weights=list(corpus.language_mix.values()))[0]
+        word_count = 2 if randomizer.random() < _TWO_WORD_QUERY_SHARE else 1
+        words = randomizer.choices(
+            corpus.language_code_to_vocabulary_map[language_code], cum_weights=zipf_cumulative_weights, k=word_count
+        )
+        query_language_code = language_code if randomizer.random() < _LANGUAGE_QUERY_SHARE else None
+        result.append(BenchmarkQuery(" ".join(words), query_language_code))
+    return result
+
+
+def search_first_page(query: BenchmarkQuery, search_mode: SearchMode) -> List[int]:
+    """
+    The ids of the documents on the first search result page for ``query`` including the work the search
+    result view does for them except for caching.
+    """
+    page = keyset_page(
+        documents_matching(query.search_term, query.language_code, search_mode).only("id"), "rank", PAGE_SIZE
+    )
+    result = [document.id for document in page.items]
+    if search_mode == SearchMode.FULLTEXT:
+        snippets_for(result, query.search_term, query.language_code)
+    return result
+
+
+def benchmark_report(
+    corpus: SyntheticCorpus, queries: List[BenchmarkQuery], explain_count: int = DEFAULT_EXPLAIN_COUNT
+) -> Dict[str, Any]:
+    """
+    Latency percentiles and rows scanned for each search mode together with the sizes of tables and
+    indexes as JSON compatible data. Rows scanned are taken from ``EXPLAIN ANALYZE`` of the first
+    ``explain_count`` distinct queries.
+    """
+    strategies = {}
+    distinct_queries = list(dict.fromkeys(queries))[:explain_count]
+    for search_mode in SearchMode:
+        durations_in_ms = []
+        for query in queries:
+            start_time = time.perf_counter()
+            search_first_page(query, search_mode)
+            durations_in_ms.append((time.perf_counter() - start_time) * 1000)
+        percentiles = statistics.quantiles(durations_in_ms, n=100) if len(durations_in_ms) >= 2 else None
+        rows_scanned = [_rows_scanned(query, search_mode) for query in distinct_queries]
+        strategies[search_mode.value] = {
+            "query_count": len(durations_in_ms),
+            "p50_ms": round(percentiles[49], 3) if percentiles else None,
+            "p95_ms": round(percentiles[94], 3) if percentiles else None,
+            "p99_ms": round(percentiles[98], 3) if percentiles else None,
+            "mean_rows_scanned": round(statistics.mean(rows_scanned), 1) if rows_scanned else None,
+            "max_rows_scanned": max(rows_scanned, default=None),
+        }
+    return {
+        "corpus": {
+            "document_count": corpus.document_count,
+            "passage_count": corpus.passage_count,
+            "language_mix": corpus.language_mix,
+            "seed": corpus.seed,
+            "zipf_exponent": corpus.zipf_exponent,
+        },
+        "strategies": strategies,
+        "relation_sizes": _relation_sizes(),
+    }
+
+
+def report_json(report: Dict[str, Any]) -> str:
+    # Sorted keys and indentation make reports of different runs easy to diff.
+    return json.dumps(report, indent=2, sort_keys=True)
+
+
+def _rows_scanned(query: BenchmarkQuery, search_mode: SearchMode) -> int:
+    queryset = documents_matching(query.search_term, query.language_code, search_mode).only("id")[:PAGE_SIZE]
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"explain (analyze, format json) {sql}", params)
+        (plan,) = cursor.fetchone()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return sum(_scanned_rows_of_nodes(plan[0]["Plan"]))
+
+
+def _scanned_rows_of_nodes(node: Dict[str, Any]) -> Iterator[int]:
+    if "Scan" in node["Node Type"]:
+        yield int(
+            (
+                node.get("Actual Rows", 0)
+                + node.get("Rows Removed by Filter", 0)
+                + node.get("Rows Removed by Index Recheck", 0)
+            )
+            * node.get("Actual Loops", 1)
+        )
+    for child_node in node.get("Plans", []):
+        yield from _scanned_rows_of_nodes(child_node)
+
+
+def _relation_sizes() -> Dict[str, int]:
+    """
+    Size in bytes of each table (including TOAST) and index of the gutensearch app.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            select relname, pg_total_relation_size(oid) - pg_indexes_size(oid)
+            from pg_class
+            where relkind = 'r' and relname like 'gutensearch\\_%%'
+            union all
+            select indexrelname, pg_relation_size(indexrelid)
+            from pg_stat_user_indexes
+            where relname like 'gutensearch\\_%%'
+            """
+        )
+        return dict(sorted(cursor.fetchall()))
+
+
+def _zipf_cumulative_weights(count: int, exponent: float) -> List[float]:
+    return list(accumulate(1 / rank**exponent for rank in range(1, count + 1)))
+
+
+def _vocabulary(randomizer: random.Random) -> List[str]:
+    result = {}
+    while len(result) < _VOCABULARY_SIZE:
+        word = "".join(
+            randomizer.choice(_CONSONANTS) + randomizer.choice(_VOWELS) for _ in range(randomizer.randint(1, 4))
+        )
+        if len(word) >= 3:
+            result[word] = None
+    return list(result)
+
+
+def _author(randomizer: random.Random) -> str:
+    return " ".join(
+        "".join(randomizer.choice(_CONSONANTS) + randomizer.choice(_VOWELS) for _ in range(randomizer.randint(2, 3)))
+        for _ in range(2)
+    ).title()
+
+
+def _text_lines(
+    randomizer: random.Random, vocabulary: List[str], cumulative_weights: List[float], word_count: int
+) -> Iterator[str]:
+    words = randomizer.choices(vocabulary, cum_weights=cumulative_weights, k=word_count)
+    for line_number, start in enumerate(range(0, word_count, _WORDS_PER_LINE), start=1):
+        yield " ".join(words[start : start + _WORDS_PER_LINE])
+        yield "\n\n" if line_number % _LINES_PER_PARAGRAPH == 0 else "\n"
@@ -1,9 +1,18 @@
+from typing import Optional
+
 from django import forms
 from django.utils.translation import gettext_lazy as _
 
+from gutensearch.search import LANGUAGE_CODE_TO_SEARCH_CONFIG_MAP, SearchMode, default_search_mode
+
 MIN_SEARCH_TERM_LENGTH = 3
 MAX_SEARCH_TERM_LENGTH = 1000
 
+_LANGUAGE_CHOICES = [("", _("Any language"))] + sorted(
+    (language_code, search_config.title())
+    for language_code, search_config in LANGUAGE_CODE_TO_SEARCH_CONFIG_MAP.items()
+)
+
 
 class SearchForm(forms.Form):
     search_term = forms.CharField(
@@ -11,4 +20,23 @@ class SearchForm(forms.Form):
         localize=True,
         min_length=MIN_SEARCH_TERM_LENGTH,
         max_length=MAX_SEARCH_TERM_LENGTH,
+        widget=forms.TextInput(attrs={"autocomplete": "off", "list": "search_suggestions"}),
+    )
+    language_code = forms.ChoiceField(
+        label=_("Language"),
+        choices=_LANGUAGE_CHOICES,
+        required=False,
     )
+    search_mode = forms.ChoiceField(
+        label=_("Search mode"),
+        choices=SearchMode.choices,
+        initial=default_search_mode,
+        required=False,
+    )
+
+    def clean_language_code(self) -> Optional[str]:
+        return self.cleaned_data["language_code"] or None
+
+    def clean_search_mode(self) -> Optional[SearchMode]:
+        search_mode = self.cleaned_data["search_mode"]
+        return SearchMode(search_mode) if search_mode else None
@@ -0,0 +1,448 @@
+"""
+Parsing of Project Gutenberg document files.
+
+This module intentionally does not depend on Django's models so it can be used from worker processes of
+``gutenlader --jobs`` without having to set up Django there.
+"""
+import codecs
+import hashlib
+import io
+import re
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, List, NamedTuple, Optional, Tuple
+
+from django.core.management.base import CommandError
+
+from gutensearch.profiling import StageProfile, stage_of
+
+MAX_INTRO_LENGTH = 10000
+MAX_INTRO_LINES = 200
+
+#: zlib compression level for the HTML of documents.
+HTML_COMPRESSION_LEVEL = 6
+
+#: Maximum number of characters in a passage, which keeps the search vectors well below the limit of
+#: PostgreSQL's tsvector of 1 MB.
+MAX_PASSAGE_LENGTH = 8 * 1024
+
+DEFAULT_ENCODING = "iso-8859-1"
+
+UNKNOWN_LANGUAGE_CODE = "??"
+
+WARNING_MAPPING_BROKEN_ENCODING = "W100"
+WARNING_CANNOT_DETERMINE_ENCODING = "W101"
+WARNING_UNKNOWN_PYTHON_ENCODING = "W102"
+WARNING_NO_START_MARKER_FOUND = "W200"
+WARNING_NO_END_MARKER_FOUND = "W201"
+WARNING_NO_ISO_LANGUAGE = "W300"
+WARNING_MULTIPLE_LANGUAGES = "W301"
+WARNING_UNKNOWN_LANGUAGE = "W302"
+WARNING_FILE_TOO_LARGE = "W400"
+
+#: Names of the stages of parsing measured with ``gutenlader --profile``.
+STAGE_READ_TEXT = "read text"
+STAGE_READ_HTML = "read HTML"
+STAGE_SCAN_LINES = "scan lines"
+STAGE_PARSE_METADATA = "parse metadata"
+STAGE_COMPRESS_HTML = "compress HTML"
+STAGE_SPLIT_PASSAGES = "split passages"
+
+_DECODE_BUFFER_SIZE = 256 * 1024
+
+_ENCODING_MARKER = "Character set encoding:"
+# Markers for the start and end of the actual text. Because they are also searched in the full text using
+# re.MULTILINE, whitespace is limited to the current line using "[^\S\n]" instead of "\s".
+_END_EBOOK_MARKER_REGEX = re.compile(
+    r"^[^\S\n]*\*+[^\S\n]*END[^\S\n]+OF[^\S\n]+TH(E|IS)[^\S\n]+PROJECT[^\S\n]+GUTENBERG[^\S\n]+EBOOK", re.MULTILINE
+)
+_START_EBOOK_MARKER_REGEX = re.compile(
+    r"^[^\S\n]*\*+[^\S\n]*START[^\S\n]+OF[^\S\n]+TH(E|IS)[^\S\n]+PROJECT[^\S\n]+GUTENBERG[^\S\n]+EBOOK", re.MULTILINE
+)
+
+_LANGUAGE_TO_LANGUAGE_CODE_MAP = {
+    "": UNKNOWN_LANGUAGE_CODE,
+    "Afrikaans": "af",
+    "Arabic": "ar",
+    "Catalan": "ca",
+    "Chinese": "zh",
+    "Czech": "cs",
+    "Danish": "da",
+    "Dutch": "nl",
+    "English": "en",
+    "Esperanto": "eo",
+    "Estonian": "et",
+    "Finnish": "fi",
+    "French": "fr",
+    "Frisian": "fy",
+    "Galician": "gl",
+    "German": "de",
+    "Greek": "el",
+    "Hungarian": "hu",
+    "Icelandic": "is",
+    "Inuktitut": "iu",
+    "Italian": "it",
+    "Irish": "ga",
+    "Japanese": "jp",
+    "Latin": "la",
+    "Norwegian": "no",
+    "Polish": "pl",
+    "Portuguese": "pt",
+    "Russian": "ru",
+    "Serbian": "sr",
+    "Slovenian": "sl",
+    "Spanish": "es",
+    "Swedish": "sv",
+    "Tagalog": "tl",
+    "Welsh": "cy",
+}
+
+# Languages without ISO-639-1 code but for which Gutenberg documents exist.
+_NO_ISO_LANGUAGES = {
+    "Arapaho",
+    "Bagobo",
+    "Cebuano",
+    "Friulian",
+    "Gascon",
+    "Iloko",
+    "Ilocano",
+    "Quiche",
+}
+
+_SINGLE_LANGUAGE_REGEX = re.compile(r"^[a-z][a-z\-]+$")
+
+_CP_HYPHEN_REGEX = re.compile("^cp-")
+
+_BROKEN_ENCODING_TO_ENCODING_MAP = {
+    "": "cp1252",
+    "a": "iso-8859-1",
+    "iso latin-1": "iso-8859-1",
+    "iso-latin-1": "iso-8859-1",
+    "iso-646-us (us-ascii)": "ascii",
+    "iso-8559-1": "iso-8859-1",
+    "iso-859-1": "iso-8859-1",
+    "iso-8858-1": "iso-8859-1",
+    "iso-8859": "iso-8859-1",
+    "iso 8859-1 (latin-1)": "iso-8859-1",
+    "n": "iso-8859-1",
+    "unicode utf-8": "utf-8",
+}
+
+
+class DocumentWarning(NamedTuple):
+    path: Path
+    code: str
+    message: str
+
+
+class ParsedDocument(NamedTuple):
+    id: int
+    authors: str
+    compressed_html: bytes
+    #: SHA-256 hex digest of the text and HTML file if the parser is hashing, otherwise empty.
+    content_hash: str
+    language_code: str
+    passage_ends: List[int]
+    text: str
+    title: str
+
+
+class ParseResult(NamedTuple):
+    document_id: int
+    document: Optional[ParsedDocument]
+    warnings: List[DocumentWarning]
+    error: Optional[str]
+    #: Time spent in each stage of parsing if the parser is profiling.
+    profile: Optional[StageProfile] = None
+
+
+class DocumentParser:
+    def __init__(self, max_length: int, is_profiling: bool = False, is_hashing: bool = False):
+        self._max_length = max_length
+        self._is_profiling = is_profiling
+        self._is_hashing = is_hashing
+        self._profile: Optional[StageProfile] = None
+        self._warnings: List[DocumentWarning] = []
+
+    def parse(self, document_id: int, text_path: Path, html_path: Path) -> ParseResult:
+        """
+        The parsed document (or ``None`` if it should be skipped) together with any warnings and
+        a possible error message, which the caller is expected to report.
+        """
+        self._warnings = []
+        self._profile = StageProfile() if self._is_profiling else None
+        try:
+            document = self._document_from(document_id, text_path, html_path)
+            error = None
+        except CommandError as command_error:
+            document = None
+            error = str(command_error)
+        return ParseResult(document_id, document, self._warnings, error, self._profile)
+
+    def _document_from(self, document_id: int, text_path: Path, html_path: Path) -> Optional[ParsedDocument]:
+        # The sizes of decoded text are measured in characters, which for most documents is close to bytes.
+        result = None
+        # The files are hashed while they are read anyway, so hashing needs no extra pass over them.
+        content_hash = hashlib.sha256() if self._is_hashing else None
+        with stage_of(self._profile, STAGE_READ_TEXT) as stage:
+            full_text = self._full_text_from(text_path, content_hash)
+            stage.byte_count = len(full_text)
+        full_text_length = len(full_text)
+        if full_text_length <= self._max_length or self._max_length <= 0:
+            with stage_of(self._profile, STAGE_READ_HTML) as stage:
+                html = self._full_text_from(html_path, content_hash)
+                stage.byte_count = len(html)
+            if html is not None:
+                with stage_of(self._profile, STAGE_SCAN_LINES, full_text_length):
+                    intro_lines, text = self._intro_lines_and_text(text_path, full_text)
+                with stage_of(self._profile, STAGE_PARSE_METADATA) as stage:
+                    title, authors, language = _title_authors_language_from(intro_lines)
+                    language_code = self._language_code(text_path, language)
+                    stage.byte_count = sum(len(intro_line) for intro_line in intro_lines)
+                with stage_of(self._profile, STAGE_COMPRESS_HTML) as stage:
+                    html_bytes = html.encode("utf-8")
+                    compressed_html = zlib.compress(html_bytes, HTML_COMPRESSION_LEVEL)
+                    stage.byte_count = len(html_bytes)
+                with stage_of(self._profile, STAGE_SPLIT_PASSAGES, len(text)):
+                    text_passage_ends = passage_ends(text)
+                result = ParsedDocument(
+                    id=document_id,
+                    authors=authors,
+                    compressed_html=compressed_html,
+                    content_hash=content_hash.hexdigest() if content_hash is not None else "",
+                    language_code=language_code,
+                    passage_ends=text_passage_ends,
+                    text=text,
+                    title=title,
+                )
+        else:
+            full_text_length_in_mb = full_text_length / 1024 / 1024
+            self._log_document_warning(
+                text_path, WARNING_FILE_TOO_LARGE, f"Skipping too long file: {full_text_length_in_mb:.2f} MB"
+            )
+        return result
+
+    def _log_document_warning(self, path: Path, code, message: str):
+        self._warnings.append(DocumentWarning(path, code, message))
+
+    def _full_text_from(self, path: Path, content_hash: Optional[Any] = None) -> str:
+        """
+        The content of the document file at ``path`` with normalized newlines. The encoding is determined
+        from the intro, which is limited to ``MAX_INTRO_LENGTH`` bytes, and the file is decoded in
+        chunks with the newlines being normalized while decoding. This way no complete copy of the raw
+        content is needed. If ``content_hash`` is passed, it is updated with the raw content.
+        """
+        try:
+            with open(path, "rb") as text_file:
+                intro = text_file.read(MAX_INTRO_LENGTH)
+                actual_encoding = self._encoding_from(path, intro)
+                text_file.seek(0)
+                raw_file = (
+                    text_file if content_hash is None else io.BufferedReader(_HashingReader(text_file, content_hash))
+                )
+                # newline=None normalizes "\r\n" and "\r" to "\n".
+                with io.TextIOWrapper(raw_file, encoding=actual_encoding, errors="replace", newline=None) as reader:
+                    result = "".join(iter(lambda: reader.read(_DECODE_BUFFER_SIZE), ""))
+        except Exception as error:
+            raise CommandError(f'Cannot process "{path}": {error}')
+        result = result.strip(" \n\t")
+        return result
+
+    def _encoding_from(self, path: Path, intro: bytes) -> str:
+        result = None
+        intro_lines = intro.decode(DEFAULT_ENCODING).replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        if len(intro) >= MAX_INTRO_LENGTH:
+            # Ignore the last line because it might have been cut off.
+            del intro_lines[-1]
+        for line in intro_lines[:MAX_INTRO_LINES]:
+            if _START_EBOOK_MARKER_REGEX.match(line) is not None or _END_EBOOK_MARKER_REGEX.match(line) is not None:
+                break
+            if line.startswith(_ENCODING_MARKER):
+                result = _text_after_colon(line).lower()
+                result = _CP_HYPHEN_REGEX.sub("cp", result)
+                mapped_broken_encoding = _BROKEN_ENCODING_TO_ENCODING_MAP.get(result)
+                if mapped_broken_encoding is not None:
+                    self._log_document_warning(
+                        path,
+                        WARNING_MAPPING_BROKEN_ENCODING,
+                        f"Mapping broken encoding {result!r} to {mapped_broken_encoding!r}",
+                    )
+                    result = mapped_broken_encoding
+                break
+        if result is None:
+            result = DEFAULT_ENCODING
+            self._log_document_warning(
+                path, WARNING_CANNOT_DETERMINE_ENCODING, f"Cannot determine encoding, using default {result}"
+            )
+        else:
+            try:
+                codecs.lookup(result)
+            except LookupError:
+                self._log_document_warning(
+                    path,
+                    WARNING_UNKNOWN_PYTHON_ENCODING,
+                    f"Cannot find Python encoding for {result!r}, using default encoding",
+                )
+                result = DEFAULT_ENCODING
+        return result
+
+    def _intro_lines_and_text(self, path: Path, full_text: str) -> Tuple[List[str], str]:
+        """
+        The first lines of the intro before the start marker (limited by ``MAX_INTRO_LENGTH`` and
+        ``MAX_INTRO_LINES``) and the actual text between the start and end marker.
+        """
+        start_match = _START_EBOOK_MARKER_REGEX.search(full_text)
+        if start_match is None:
+            self._log_document_warning(
+                path,
+                WARNING_NO_START_MARKER_FOUND,
+                "No gutenberg start marker found, document is considered to be empty",
+            )
+            intro_end = len(full_text)
+            text = ""
+        else:
+            intro_end = start_match.start()
+            text_start = full_text.find("\n", start_match.end())
+            text_start = len(full_text) if text_start == -1 else text_start + 1
+            end_match = _END_EBOOK_MARKER_REGEX.search(full_text, text_start)
+            if end_match is None:
+                self._log_document_warning(
+                    path,
+                    WARNING_NO_END_MARKER_FOUND,
+                    "No gutenberg end marker found, document might include unwanted suffix lines",
+                )
+                text_end = len(full_text)
+            else:
+                text_end = end_match.start()
+            text = full_text[text_start:text_end].strip(" \n\t")
+        intro_lines = full_text[: min(intro_end, MAX_INTRO_LENGTH)].split("\n", MAX_INTRO_LINES)[:MAX_INTRO_LINES]
+        if intro_end > MAX_INTRO_LENGTH:
+            # Ignore the last line because it might have been cut off.
+            del intro_lines[-1]
+        return intro_lines, text
+
+    def _language_code(self, path: Path, language: str) -> str:
+        language_lower = language.lower()
+        is_single_language = _SINGLE_LANGUAGE_REGEX.match(language_lower) is not None
+        result = _LANGUAGE_TO_LANGUAGE_CODE_MAP.get(language) if len(language) != 2 else language_lower
+        if result is None:
+            cleaned_language = language.title()
+            result = _LANGUAGE_TO_LANGUAGE_CODE_MAP.get(cleaned_language)
+            if result is None:
+                result = UNKNOWN_LANGUAGE_CODE
+                if cleaned_language in _NO_ISO_LANGUAGES:
+                    self._log_document_warning(
+                        path,
+                        WARNING_NO_ISO_LANGUAGE,
+                        f"Language {language!r} has no ISO-639-1 code, treating as unknown language",
+                    )
+                elif not is_single_language:
+                    self._log_document_warning(
+                        path,
+                        WARNING_MULTIPLE_LANGUAGES,
+                        f"Document is written in multiple languages, treating as unknown language: {language!r}",
+                    )
+                else:
+                    self._log_document_warning(
+                        path,
+                        WARNING_UNKNOWN_LANGUAGE,
+                        f"Unknown language {cleaned_language!r} should be added to _LANGUAGE_TO_LANGUAGE_CODE_MAP "
+                        f"or _NO_ISO_LANGUAGES",
+                    )
+        return result
+
+
+class _HashingReader(io.RawIOBase):
+    """
+    Reader passing on the bytes of ``raw_file`` while adding them to ``content_hash``.
+    """
+
+    def __init__(self, raw_file: BinaryIO, content_hash: Any):
+        super().__init__()
+        self._raw_file = raw_file
+        self._content_hash = content_hash
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        result = self._raw_file.readinto(buffer)
+        if result:
+            self._content_hash.update(memoryview(buffer)[:result])
+        return result
+
+
+_worker_parser: Optional[DocumentParser] = None
+
+
+def init_worker(max_length: int, is_profiling: bool = False, is_hashing: bool = False):
+    global _worker_parser
+    _worker_parser = DocumentParser(max_length, is_profiling, is_hashing)
+
+
+def parse_in_worker(document_id: int, text_path: Path, html_path: Path) -> ParseResult:
+    assert _worker_parser is not None, "init_worker() must be called first"
+    return _worker_parser.parse(document_id, text_path, html_path)
+
+
+def passage_ends(text: str, max_passage_length: int = MAX_PASSAGE_LENGTH) -> List[int]:
+    """
+    Offsets in ``text`` where each passage ends. Passages end at the last paragraph break within
+    ``max_passage_length`` characters or, failing that, the last line break or space. Only if none of
+    these is found in the second half of the passage it is cut at ``max_passage_length``.
+    """
+    assert max_passage_length >= 2
+    result = []
+    text_length = len(text)
+    passage_start = 0
+    while text_length - passage_start > max_passage_length:
+        limit = passage_start + max_passage_length
+        min_end = passage_start + max_passage_length // 2
+        passage_end = -1
+        for separator in ("\n\n", "\n", " "):
+            passage_end = text.rfind(separator, min_end, limit)
+            if passage_end != -1:
+                break
+        if passage_end == -1:
+            passage_end = limit
+        result.append(passage_end)
+        passage_start = passage_end
+    if passage_start < text_length:
+        result.append(text_length)
+    return result
+
+
+def passages_from(text: str, ends: List[int]) -> List[str]:
+    """
+    The non empty passages of ``text`` ending at ``ends`` as computed by :py:func:`passage_ends`.
+    """
+    result = []
+    passage_start = 0
+    for passage_end in ends:
+        passage = text[passage_start:passage_end].strip()
+        if passage:
+            result.append(passage)
+        passage_start = passage_end
+    return result
+
+
+def _title_authors_language_from(intro_lines: List[str]) -> Tuple[str, str, str]:
+    title = ""
+    authors = ""
+    language = ""
+    intro_line_count = len(intro_lines)
+    intro_line_index = 0
+    while intro_line_index < intro_line_count and (not title or not authors or not language):
+        intro_line = intro_lines[intro_line_index]
+        if intro_line.startswith("Author:"):
+            authors = _text_after_colon(intro_line)
+        elif intro_line.startswith("Language:"):
+            language = _text_after_colon(intro_line)
+        elif intro_line.startswith("Title:"):
+            title = _text_after_colon(intro_line)
+        intro_line_index += 1
+    return title, authors, language
+
+
+def _text_after_colon(line: str) -> str:
+    return line.split(":", 1)[1].split("<", 1)[0].strip()
@@ -0,0 +1,335 @@
+"""
+Measuring the SQL and time spent by the search result and document views in production.
+
+Queries are measured by an execute wrapper installed on each database connection, which only records
+queries of requests the :py:class:`QueryMetricsMiddleware` measures. Unlike ``connection.queries``,
+this works without ``DEBUG`` and keeps only the slowest query of each request.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.http.request import HttpRequest
+from django.http.response import HttpResponse
+
+#: URL names of the views to measure.
+MEASURED_URL_NAMES = ("search_result", "document")
+
+SEARCH_RESULT_URL_NAME = "search_result"
+
+DEFAULT_SLOW_SEARCH_THRESHOLD_IN_MS = 500
+DEFAULT_SLOW_SEARCH_LOG_SIZE = 100
+
+#: Upper bounds in seconds of the buckets of the request duration histogram.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+#: Time in milliseconds ``EXPLAIN ANALYZE`` of a slow query may take, which runs the query again.
+_EXPLAIN_TIMEOUT_IN_MS = 5000
+
+_log = logging.getLogger(__name__)
+
+
+class RequestMetrics:
+    """
+    Number and duration of the SQL queries of a request, and the slowest ``SELECT`` among them.
+    """
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.slowest_select_alias: Optional[str] = None
+        self.slowest_select_sql: Optional[str] = None
+        self.slowest_select_params: Optional[Sequence[Any]] = None
+        self.slowest_select_seconds = 0.0
+
+    def add_query(self, alias: str, sql: str, params: Optional[Sequence[Any]], seconds: float):
+        self.sql_count += 1
+        self.sql_seconds += seconds
+        # Only queries that do not change anything can safely be run again with EXPLAIN ANALYZE.
+        if seconds > self.slowest_select_seconds and sql.lstrip()[:6].lower() == "select":
+            self.slowest_select_alias = alias
+            self.slowest_select_sql = sql
+            self.slowest_select_params = params
+            self.slowest_select_seconds = seconds
+
+
+class SlowSearch(NamedTuple):
+    timestamp: float
+    search_term: str
+    path: str
+    total_seconds: float
+    sql_count: int
+    sql_seconds: float
+    sql: Optional[str]
+    plan: Optional[str]
+
+
+class _ViewMetrics:
+    def __init__(self):
+        self.request_count = 0
+        self.total_seconds = 0.0
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.cumulative_bucket_counts = [0] * len(DURATION_BUCKETS)
+
+
+class MetricsRegistry:
+    """
+    Metrics of the measured views and a rolling log of the most recent slow searches.
+
+    Like the search result cache, the metrics are kept per process, so each worker of a server reports
+    its own metrics.
+    """
+
+    def __init__(self, slow_search_log_size: int = DEFAULT_SLOW_SEARCH_LOG_SIZE):
+        self._lock = threading.Lock()
+        self._url_name_to_view_metrics_map: Dict[str, _ViewMetrics] = {}
+        self._slow_searches = deque(maxlen=slow_search_log_size)
+        self._slow_search_count = 0
+
+    def record(self, url_name: str, total_seconds: float, request_metrics: RequestMetrics):
+        with self._lock:
+            view_metrics = self._url_name_to_view_metrics_map.get(url_name)
+            if view_metrics is None:
+                view_metrics = _ViewMetrics()
+                self._url_name_to_view_metrics_map[url_name] = view_metrics
+            view_metrics.request_count += 1
+            view_metrics.total_seconds += total_seconds
+            view_metrics.sql_count += request_metrics.sql_count
+            view_metrics.sql_seconds += request_metrics.sql_seconds
+            for bucket_index, upper_bound in enumerate(DURATION_BUCKETS):
+                if total_seconds <= upper_bound:
+                    view_metrics.cumulative_bucket_counts[bucket_index] += 1
+
+    def add_slow_search(self, slow_search: SlowSearch):
+        with self._lock:
+            self._slow_searches.append(slow_search)
+            self._slow_search_count += 1
+
+    def slow_searches(self) -> List[SlowSearch]:
+        """
+        The most recent slow searches, newest first.
+        """
+        with self._lock:
+            return list(reversed(self._slow_searches))
+
+    def prometheus_text(self) -> str:
+        """
+        The metrics in the text based exposition format of Prometheus.
+        """
+        with self._lock:
+            url_name_and_view_metrics = sorted(self._url_name_to_view_metrics_map.items())
+            slow_search_count = self._slow_search_count
+            lines = [
+                "# HELP gutensearch_request_duration_seconds Time until the view returned its response.",
+                "# TYPE gutensearch_request_duration_seconds histogram",
+            ]
+            for url_name, view_metrics in url_name_and_view_metrics:
+                for upper_bound, bucket_count in zip(DURATION_BUCKETS, view_metrics.cumulative_bucket_counts):
+                    lines.append(
+                        f'gutensearch_request_duration_seconds_bucket{{view="{url_name}",le="{upper_bound}"}} '
+                        f"{bucket_count}"
+                    )
+                lines.extend(
+                    [
+                        f'gutensearch_request_duration_seconds_bucket{{view="{url_name}",le="+Inf"}} '
+                        f"{view_metrics.request_count}",
+                        f'gutensearch_request_duration_seconds_sum{{view="{url_name}"}} {view_metrics.total_seconds}',
+                        f'gutensearch_request_duration_seconds_count{{view="{url_name}"}} '
+                        f"{view_metrics.request_count}",
+                    ]
+                )
+            lines.extend(
+                [
+                    "# HELP gutensearch_sql_queries_total Number of SQL queries run by the view.",
+                    "# TYPE gutensearch_sql_queries_total counter",
+                    *(
+                        f'gutensearch_sql_queries_total{{view="{url_name}"}} {view_metrics.sql_count}'
+                        for url_name, view_metrics in url_name_and_view_metrics
+                    ),
+                    "# HELP gutensearch_sql_duration_seconds_total Time spent in SQL queries run by the view.",
+                    "# TYPE gutensearch_sql_duration_seconds_total counter",
+                    *(
+                        f'gutensearch_sql_duration_seconds_total{{view="{url_name}"}} {view_metrics.sql_seconds}'
+                        for url_name, view_metrics in url_name_and_view_metrics
+                    ),
+                    "# HELP gutensearch_slow_searches_total Number of searches slower than the threshold.",
+                    "# TYPE gutensearch_slow_searches_total counter",
+                    f"gutensearch_slow_searches_total {slow_search_count}",
+                ]
+            )
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry(getattr(settings, "GUTENSEARCH_SLOW_SEARCH_LOG_SIZE", DEFAULT_SLOW_SEARCH_LOG_SIZE))
+
+_current_request_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+# EXPLAIN ANALYZE runs the query again, so at most one slow query per process is explained at a time.
+_explain_lock = threading.Lock()
+
+# Slow searches are explained after their response has been returned. Slow searches arriving while
+# another one is still waiting to be explained are logged without a plan instead of queueing up.
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gutensearch-explain")
+_explain_slot = threading.BoundedSemaphore()
+
+
+def record_query(execute: Callable, sql: str, params: Optional[Sequence[Any]], many: bool, context: Dict[str, Any]):
+    """
+    Execute wrapper adding the query to the metrics of the current request, if it is measured.
+    """
+    request_metrics = _current_request_metrics.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    start_time = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.add_query(context["connection"].alias, sql, params, time.perf_counter() - start_time)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Receiver for ``connection_created`` adding :py:func:`record_query` to each new connection.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def explained_plan(alias: str, sql: str, params: Optional[Sequence[Any]]) -> Optional[str]:
+    """
+    The plan of ``sql`` with actual times and buffers used, or ``None`` if it cannot be explained in time
+    or another query is being explained.
+    """
+    if not _explain_lock.acquire(blocking=False):
+        return None
+    try:
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            cursor.execute("select set_config('statement_timeout', %s, true)", [f"{_EXPLAIN_TIMEOUT_IN_MS}ms"])
+            cursor.execute(f"explain (analyze, buffers) {sql}", params)
+            return "\n".join(row[0] for row in cursor.fetchall())
+    except DatabaseError as error:
+        _log.info("cannot explain slow query: %s", error)
+        return None
+    finally:
+        _explain_lock.release()
+
+
+class QueryMetricsMiddleware:
+    """
+    Record the number and duration of SQL queries and the total duration of the views named in
+    ``MEASURED_URL_NAMES``, and log searches that take longer than
+    ``GUTENSEARCH_SLOW_SEARCH_THRESHOLD_IN_MS`` together with the plan of their slowest query. The plan is
+    explained in a background thread so the response does not wait for the query to run again.
+
+    For streamed responses like documents, the total duration ends when the response starts streaming.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._slow_search_threshold_in_seconds = (
+            getattr(settings, "GUTENSEARCH_SLOW_SEARCH_THRESHOLD_IN_MS", DEFAULT_SLOW_SEARCH_THRESHOLD_IN_MS) / 1000
+        )
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics = RequestMetrics()
+        token = _current_request_metrics.set(request_metrics)
+        start_time = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request_metrics.reset(token)
+        total_seconds = self._recorded(request, start_time, request_metrics)
+        if self._is_slow_search(request, total_seconds):
+            self._log_slow_search(request, total_seconds, request_metrics)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        request_metrics = RequestMetrics()
+        token = _current_request_metrics.set(request_metrics)
+        start_time = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_request_metrics.reset(token)
+        total_seconds = self._recorded(request, start_time, request_metrics)
+        if self._is_slow_search(request, total_seconds):
+            self._log_slow_search(request, total_seconds, request_metrics)
+        return response
+
+    @staticmethod
+    def _recorded(request: HttpRequest, start_time: float, request_metrics: RequestMetrics) -> Optional[float]:
+        """
+        The total duration of the request if it is measured, otherwise ``None``.
+        """
+        resolver_match = request.resolver_match
+        url_name = resolver_match.url_name if resolver_match is not None else None
+        if url_name not in MEASURED_URL_NAMES:
+            return None
+        result = time.perf_counter() - start_time
+        metrics_registry.record(url_name, result, request_metrics)
+        return result
+
+    def _is_slow_search(self, request: HttpRequest, total_seconds: Optional[float]) -> bool:
+        return (
+            total_seconds is not None
+            and total_seconds >= self._slow_search_threshold_in_seconds
+            and request.resolver_match.url_name == SEARCH_RESULT_URL_NAME
+        )
+
+    @staticmethod
+    def _log_slow_search(request: HttpRequest, total_seconds: float, request_metrics: RequestMetrics):
+        search_term = request.GET.get("search_term", "")
+        slow_search = SlowSearch(
+            timestamp=time.time(),
+            search_term=search_term,
+            path=request.get_full_path(),
+            total_seconds=total_seconds,
+            sql_count=request_metrics.sql_count,
+            sql_seconds=request_metrics.sql_seconds,
+            sql=request_metrics.slowest_select_sql,
+            plan=None,
+        )
+        if request_metrics.slowest_select_sql is not None and _explain_slot.acquire(blocking=False):
+            _explain_executor.submit(_add_explained_slow_search, slow_search, request_metrics)
+        else:
+            metrics_registry.add_slow_search(slow_search)
+        _log.warning(
+            "slow search for %r took %.0f ms with %d queries taking %.0f ms",
+            search_term,
+            total_seconds * 1000,
+            request_metrics.sql_count,
+            request_metrics.sql_seconds * 1000,
+        )
+
+
+def _add_explained_slow_search(slow_search: SlowSearch, request_metrics: RequestMetrics):
+    """
+    Add ``slow_search`` with the plan of its slowest query to the slow search log, in the background.
+    """
+    plan = None
+    try:
+        plan = explained_plan(
+            request_metrics.slowest_select_alias,
+            request_metrics.slowest_select_sql,
+            request_metrics.slowest_select_params,
+        )
+    finally:
+        metrics_registry.add_slow_search(slow_search._replace(plan=plan))
+        # Unlike request threads, nothing closes the connections opened by this thread.
+        connections.close_all()
+        _explain_slot.release()
@@ -0,0 +1,156 @@
+import io
+from typing import Any, Iterator, List, Optional, Type
+
+from django.db import connection, models, transaction
+
+#: Fields that are computed in the database after loading and consequently are not loaded.
+_COMPUTED_FIELD_NAMES = {"search_vector"}
+
+_COPY_BUFFER_SIZE = 64 * 1024
+_COPY_NULL = b"\\N"
+_COPY_ESCAPE_TABLE = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+class BulkCreateLoader:
+    """
+    Loader inserting model instances with multi row ``INSERT`` statements.
+    """
+
+    def __init__(self, model: Type[models.Model], upsert: bool = False):
+        self._model = model
+        self._upsert = upsert
+        self._update_fields = _update_field_names(model)
+
+    def load(self, instances: List[models.Model]):
+        if self._upsert:
+            self._model.objects.bulk_create(
+                instances, update_conflicts=True, unique_fields=["pk"], update_fields=self._update_fields
+            )
+        else:
+            self._model.objects.bulk_create(instances)
+
+
+class CopyLoader:
+    """
+    Loader streaming model instances into PostgreSQL using ``COPY ... FROM STDIN`` in text format. This
+    avoids building and escaping huge SQL parameters and needs only one round trip per call of
+    :py:meth:`load`.
+
+    To upsert, the rows are copied into a temporary table first and then merged with
+    ``INSERT ... ON CONFLICT``. Instances without a primary key get one from the sequence of the table.
+    """
+
+    def __init__(self, model: Type[models.Model], upsert: bool = False):
+        self._model = model
+        self._upsert = upsert
+        self._fields = [field for field in model._meta.concrete_fields if field.name not in _COMPUTED_FIELD_NAMES]
+
+    def load(self, instances: List[models.Model]):
+        if not instances:
+            return
+        quote_name = connection.ops.quote_name
+        db_table = self._model._meta.db_table
+        has_primary_keys = instances[0].pk is not None
+        fields = self._fields if has_primary_keys else [field for field in self._fields if not field.primary_key]
+        column_names = ", ".join(quote_name(field.column) for field in fields)
+        rows = _CopyRowsStream(self._copy_rows(fields, instances))
+        with transaction.atomic(), connection.cursor() as cursor:
+            if self._upsert:
+                assert has_primary_keys, "to upsert, instances must have a primary key"
+                copy_table = f"{db_table}_copy"
+                cursor.execute(
+                    f"create temporary table {quote_name(copy_table)} "
+                    f"(like {quote_name(db_table)} including defaults)"
+                )
+                cursor.copy_expert(
+                    f"copy {quote_name(copy_table)} ({column_names}) from stdin", rows, size=_COPY_BUFFER_SIZE
+                )
+                primary_key_column = quote_name(self._model._meta.pk.column)
+                updates = ", ".join(
+                    f"{quote_name(field.column)} = excluded.{quote_name(field.column)}"
+                    for field in fields
+                    if not field.primary_key
+                )
+                cursor.execute(
+                    f"insert into {quote_name(db_table)} ({column_names}) "
+                    f"select {column_names} from {quote_name(copy_table)} "
+                    f"on conflict ({primary_key_column}) do update set {updates}"
+                )
+                cursor.execute(f"drop table {quote_name(copy_table)}")
+            else:
+                cursor.copy_expert(
+                    f"copy {quote_name(db_table)} ({column_names}) from stdin", rows, size=_COPY_BUFFER_SIZE
+                )
+
+    @staticmethod
+    def _copy_rows(fields: List[models.Field], instances: List[models.Model]) -> Iterator[bytes]:
+        for instance in instances:
+            values = (_copy_value(_db_value(field, instance)) for field in fields)
+            yield b"\t".join(values) + b"\n"
+
+
+class _CopyRowsStream(io.RawIOBase):
+    """
+    Read only file like object with the content of the rows yielded by a generator, which can be
+    passed to ``cursor.copy_expert()`` without first building the whole content in memory.
+    """
+
+    def __init__(self, rows: Iterator[bytes]):
+        super().__init__()
+        self._rows = rows
+        self._pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            try:
+                self._pending = memoryview(next(self._rows))
+            except StopIteration:
+                return 0
+        result = min(len(buffer), len(self._pending))
+        buffer[:result] = self._pending[:result]
+        self._pending = self._pending[result:]
+        return result
+
+
+def truncate(models_to_truncate: List[Type[models.Model]]):
+    """
+    Remove all rows of the tables of ``models_to_truncate`` with a single ``TRUNCATE``. Unlike
+    ``QuerySet.delete()`` for models that other models refer to, this does not fetch the rows first.
+    """
+    quote_name = connection.ops.quote_name
+    table_names = ", ".join(quote_name(model._meta.db_table) for model in models_to_truncate)
+    with connection.cursor() as cursor:
+        cursor.execute(f"truncate {table_names}")
+
+
+def _db_value(field: models.Field, instance: models.Model) -> Optional[Any]:
+    value = getattr(instance, field.attname)
+    # For binary fields, the database adapter would wrap the bytes in an object meant for SQL parameters.
+    return value if isinstance(field, models.BinaryField) else field.get_db_prep_save(value, connection)
+
+
+def _copy_value(value: Optional[Any]) -> bytes:
+    if value is None:
+        return _COPY_NULL
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return b"\\\\x" + bytes(value).hex().encode("ascii")
+    if isinstance(value, bool):
+        return b"t" if value else b"f"
+    return str(value).translate(_COPY_ESCAPE_TABLE).encode("utf-8")
+
+
+def _update_field_names(model: Type[models.Model]) -> List[str]:
+    return [
+        field.name
+        for field in model._meta.concrete_fields
+        if not field.primary_key and field.name not in _COMPUTED_FIELD_NAMES
+    ]
+
+
+LOADER_CLASSES = {
+    "bulk_create": BulkCreateLoader,
+    "copy": CopyLoader,
+}
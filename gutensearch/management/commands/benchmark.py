@@ -0,0 +1,111 @@
+from pathlib import Path
+from typing import Optional
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gutensearch.benchmark import (
+    DEFAULT_DOCUMENT_COUNT,
+    DEFAULT_EXPLAIN_COUNT,
+    DEFAULT_LANGUAGE_MIX,
+    DEFAULT_QUERY_COUNT,
+    DEFAULT_SEED,
+    DEFAULT_WORDS_PER_DOCUMENT,
+    DEFAULT_ZIPF_EXPONENT,
+    benchmark_report,
+    generate_corpus,
+    language_mix_from,
+    report_json,
+    zipf_queries,
+)
+
+_DEFAULT_LANGUAGES = ",".join(f"{language_code}={share}" for language_code, share in DEFAULT_LANGUAGE_MIX.items())
+
+
+class Command(BaseCommand):
+    help = "Replace all documents by a synthetic corpus and benchmark the search strategies on it"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--documents",
+            "-d",
+            default=DEFAULT_DOCUMENT_COUNT,
+            type=int,
+            help="number of synthetic documents to generate; default: %(default)d",
+        )
+        parser.add_argument(
+            "--explain",
+            default=DEFAULT_EXPLAIN_COUNT,
+            metavar="COUNT",
+            type=int,
+            help="number of distinct queries to count the scanned rows for with EXPLAIN ANALYZE; default: %(default)d",
+        )
+        parser.add_argument(
+            "--languages",
+            "-l",
+            default=_DEFAULT_LANGUAGES,
+            metavar="LIST",
+            help="comma separated list of language codes and their share of documents; default: %(default)s",
+        )
+        parser.add_argument(
+            "--no-input",
+            "--noinput",
+            action="store_false",
+            dest="interactive",
+            help="do not ask for confirmation before replacing all documents",
+        )
+        parser.add_argument(
+            "--output",
+            "-o",
+            metavar="FILE",
+            type=Path,
+            help="JSON file to write the report to; default: print it",
+        )
+        parser.add_argument(
+            "--queries",
+            "-q",
+            default=DEFAULT_QUERY_COUNT,
+            type=int,
+            help="number of queries to run for each search strategy; default: %(default)d",
+        )
+        parser.add_argument(
+            "--seed",
+            default=DEFAULT_SEED,
+            type=int,
+            help="seed for the random corpus and queries; default: %(default)d",
+        )
+        parser.add_argument(
+            "--words",
+            default=DEFAULT_WORDS_PER_DOCUMENT,
+            type=int,
+            help="number of words per document; default: %(default)d",
+        )
+        parser.add_argument(
+            "--zipf",
+            default=DEFAULT_ZIPF_EXPONENT,
+            metavar="EXPONENT",
+            type=float,
+            help="exponent of the Zipf distribution of words, authors and queries; default: %(default)s",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            language_mix = language_mix_from(options["languages"])
+        except ValueError as error:
+            raise CommandError(f"cannot process --languages: {error}")
+        if options["interactive"] and not self._is_confirmed():
+            raise CommandError("Benchmark cancelled.")
+        output_path: Optional[Path] = options["output"]
+        self.stdout.write(f"Generating {options['documents']} synthetic documents")
+        corpus = generate_corpus(options["documents"], language_mix, options["words"], options["zipf"], options["seed"])
+        self.stdout.write(f"Running {options['queries']} queries for each search strategy")
+        queries = zipf_queries(corpus, options["queries"])
+        report = report_json(benchmark_report(corpus, queries, options["explain"]))
+        if output_path is None:
+            self.stdout.write(report)
+        else:
+            output_path.write_text(report + "\n", encoding="utf-8")
+            self.stdout.write(f"Wrote report to {output_path}")
+
+    def _is_confirmed(self) -> bool:
+        answer = input("This replaces all documents in the database with synthetic ones. Type 'yes' to continue: ")
+        return answer == "yes"
@@ -1,36 +1,58 @@
-import enum
+import cProfile
+import heapq
 import logging
 import os
-import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Type
 
 from django.core.management.base import BaseCommand, CommandError
 from rich.progress import track as tracked_progress
 
 from django_search_example.settings import BASE_DIR
-from gutensearch.models import Document
-
-MAX_INTRO_LENGTH = 10000
-MAX_INTRO_LINES = 200
+from gutensearch.gutenberg import (
+    WARNING_CANNOT_DETERMINE_ENCODING,
+    WARNING_FILE_TOO_LARGE,
+    WARNING_MAPPING_BROKEN_ENCODING,
+    WARNING_MULTIPLE_LANGUAGES,
+    WARNING_NO_END_MARKER_FOUND,
+    WARNING_NO_ISO_LANGUAGE,
+    WARNING_NO_START_MARKER_FOUND,
+    WARNING_UNKNOWN_LANGUAGE,
+    DocumentParser,
+    DocumentWarning,
+    ParsedDocument,
+    ParseResult,
+    init_worker,
+    parse_in_worker,
+    passages_from,
+)
+from gutensearch.loaders import LOADER_CLASSES, truncate
+from gutensearch.models import Document, DocumentHtml, Passage
+from gutensearch.profiling import StageProfile, stage_of
+from gutensearch.result_cache import bump_index_generation
+from gutensearch.scanner import DocumentFile, scanned_document_files
+from gutensearch.search import document_search_vector, passage_search_vector, update_search_vectors
+from gutensearch.shadow import ShadowTables
 
-DEFAULT_ENCODING = "iso-8859-1"
+_BATCH_SIZE = 100
+_BYTES_PER_MB = 1024 * 1024
+_DELETE_BATCH_SIZE = 10000
 
-UNKNOWN_LANGUAGE_CODE = "??"
+#: Fields that tell if the files of a document changed since the last import.
+_SOURCE_STAT_FIELDS = ("text_path", "text_size", "text_mtime_ns", "html_path", "html_size", "html_mtime_ns")
 
-WARNING_MAPPING_BROKEN_ENCODING = "W100"
-WARNING_CANNOT_DETERMINE_ENCODING = "W101"
-WARNING_UNKNOWN_PYTHON_ENCODING = "W102"
-WARNING_NO_START_MARKER_FOUND = "W200"
-WARNING_NO_END_MARKER_FOUND = "W201"
-WARNING_NO_ISO_LANGUAGE = "W300"
-WARNING_MULTIPLE_LANGUAGES = "W301"
-WARNING_UNKNOWN_LANGUAGE = "W302"
-WARNING_FILE_TOO_LARGE = "W400"
+#: Number of documents each worker process may parse ahead of the writer.
+_PARSE_AHEAD_PER_JOB = 4
 
-_BATCH_SIZE = 100
+#: Number of files that took longest to parse to report with --profile.
+_SLOWEST_FILE_COUNT = 10
 
 _DEFAULT_BASE_DIR = BASE_DIR / "gutenberg"
+_DEFAULT_MANIFEST_PATH = BASE_DIR / "gutenberg_manifest.json"
 _DEFAULT_IGNORE = ",".join(
     [
         WARNING_MAPPING_BROKEN_ENCODING,
@@ -42,103 +64,42 @@ _DEFAULT_IGNORE = ",".join(
         WARNING_FILE_TOO_LARGE,
     ]
 )
+_DEFAULT_BATCH_MEMORY = 64
+_DEFAULT_JOBS = 1
+_DEFAULT_LOADER = "bulk_create"
 _DEFAULT_MAX_COUNT = 100
-_DEFAULT_MAX_LENGTH = 512 * 1024
-
-_DOCUMENT_ID_REGEX = re.compile(r"^(?P<id>\d+)-(8.txt|h.htm)$")
-
-_ENCODING_MARKER = "Character set encoding:"
-_END_EBOOK_MARKER_REGEX = re.compile(r"^\s*\*+\s*END\s+OF\s+TH(E|IS)\s+PROJECT\s+GUTENBERG\s+EBOOK")
-_START_EBOOK_MARKER_REGEX = re.compile(r"^\s*\*+\s*START\s+OF\s+TH(E|IS)\s+PROJECT\s+GUTENBERG\s+EBOOK")
-
-_LANGUAGE_TO_LANGUAGE_CODE_MAP = {
-    "": UNKNOWN_LANGUAGE_CODE,
-    "Afrikaans": "af",
-    "Arabic": "ar",
-    "Catalan": "ca",
-    "Chinese": "zh",
-    "Czech": "cs",
-    "Danish": "da",
-    "Dutch": "nl",
-    "English": "en",
-    "Esperanto": "eo",
-    "Estonian": "et",
-    "Finnish": "fi",
-    "French": "fr",
-    "Frisian": "fy",
-    "Galician": "gl",
-    "German": "de",
-    "Greek": "el",
-    "Hungarian": "hu",
-    "Icelandic": "is",
-    "Inuktitut": "iu",
-    "Italian": "it",
-    "Irish": "ga",
-    "Japanese": "jp",
-    "Latin": "la",
-    "Norwegian": "no",
-    "Polish": "pl",
-    "Portuguese": "pt",
-    "Russian": "ru",
-    "Serbian": "sr",
-    "Slovenian": "sl",
-    "Spanish": "es",
-    "Swedish": "sv",
-    "Tagalog": "tl",
-    "Welsh": "cy",
-}
-
-# Languages without ISO-639-1 code but for which Gutenberg documents exist.
-_NO_ISO_LANGUAGES = {
-    "Arapaho",
-    "Bagobo",
-    "Cebuano",
-    "Friulian",
-    "Gascon",
-    "Iloko",
-    "Ilocano",
-    "Quiche",
-}
-
-_SINGLE_LANGUAGE_REGEX = re.compile(r"^[a-z][a-z\-]+$")
-
-_CP_HYPHEN_REGEX = re.compile("^cp-")
-
-_BROKEN_ENCODING_TO_ENCODING_MAP = {
-    "": "cp1252",
-    "a": "iso-8859-1",
-    "iso latin-1": "iso-8859-1",
-    "iso-latin-1": "iso-8859-1",
-    "iso-646-us (us-ascii)": "ascii",
-    "iso-8559-1": "iso-8859-1",
-    "iso-859-1": "iso-8859-1",
-    "iso-8858-1": "iso-8859-1",
-    "iso-8859": "iso-8859-1",
-    "iso 8859-1 (latin-1)": "iso-8859-1",
-    "n": "iso-8859-1",
-    "unicode utf-8": "utf-8",
-}
-
-_unknown_languages = set()
+_DEFAULT_MAX_LENGTH = 16 * 1024 * 1024
 
 _log = logging.getLogger(__name__)
 
 
-class _TextScannerState(enum.Enum):
-    BEFORE_TEXT = "b"
-    IN_TEXT = "t"
-    AFTER_TEXT = "a"
-
-
 class Command(BaseCommand):
     help = "Import local documents from Project Gutenberg into database"
 
-    _id_to_text_path_map: Optional[Dict[int, Path]] = None
-    _id_to_html_path_map: Optional[Dict[int, Path]] = None
+    _id_to_text_file_map: Optional[Dict[int, DocumentFile]] = None
+    _id_to_html_file_map: Optional[Dict[int, DocumentFile]] = None
+    _manifest_path: Optional[Path] = None
     _base_dir: Path = _DEFAULT_BASE_DIR
+    _batch_memory: int = _DEFAULT_BATCH_MEMORY * _BYTES_PER_MB
+    _peak_batch_memory: int = 0
+    _is_hashing: bool = False
+    _is_incremental: bool = False
+    _is_swapping: bool = False
+    _document_model: Type[Document] = Document
+    _document_html_model: Type[DocumentHtml] = DocumentHtml
+    _passage_model: Type[Passage] = Passage
+    _loader_name: str = _DEFAULT_LOADER
+    _loader = None
+    _document_html_loader = None
+    _passage_loader = None
+    _jobs: int = _DEFAULT_JOBS
     _max_count: int = _DEFAULT_MAX_COUNT
     _max_length: int = _DEFAULT_MAX_LENGTH
     _warning_codes_to_ignore = None
+    _reported_unknown_language_messages = None
+    _id_to_existing_content_hash_map: Optional[Dict[int, str]] = None
+    _profile: Optional[StageProfile] = None
+    _slowest_parse_times: Optional[List[Tuple[float, int]]] = None
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -148,6 +109,24 @@ class Command(BaseCommand):
             type=Path,
             help="directory to scan for Gutenberg documents; default: %(default)s",
         )
+        parser.add_argument(
+            "--batch-memory",
+            default=_DEFAULT_BATCH_MEMORY,
+            metavar="MB",
+            type=int,
+            help=(
+                "memory (in MB) the text and HTML of documents waiting to be stored may use "
+                "before they are stored as a batch; default: %(default)d"
+            ),
+        )
+        parser.add_argument(
+            "--hash",
+            action="store_true",
+            help=(
+                "store a SHA-256 hash of the document files; with --incremental, documents with "
+                "a changed size or modification time but the same hash are not imported again"
+            ),
+        )
         parser.add_argument(
             "--ignore",
             "-i",
@@ -158,6 +137,44 @@ class Command(BaseCommand):
                 "use empty to enable all warnings; default: %(default)s"
             ),
         )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help=(
+                "instead of replacing all documents, import only new and changed ones "
+                "and remove documents whose files do not exist anymore"
+            ),
+        )
+        parser.add_argument(
+            "--jobs",
+            "-j",
+            default=_DEFAULT_JOBS,
+            metavar="NUMBER",
+            type=int,
+            help=(
+                "number of processes to read and parse documents with; "
+                "use 0 for the number of CPUs; default: %(default)d"
+            ),
+        )
+        parser.add_argument(
+            "--loader",
+            choices=sorted(LOADER_CLASSES.keys()),
+            default=_DEFAULT_LOADER,
+            help=(
+                "how to store documents in the database: "
+                "bulk_create uses multi row INSERT statements, copy streams them using COPY; default: %(default)s"
+            ),
+        )
+        parser.add_argument(
+            "--manifest",
+            "-m",
+            default=str(_DEFAULT_MANIFEST_PATH),
+            metavar="FILE",
+            help=(
+                "file to remember the scanned document files in so later scans only need to list changed "
+                "directories; use empty to always scan all directories; default: %(default)s"
+            ),
+        )
         parser.add_argument(
             "--max-count",
             "-c",
@@ -177,213 +194,349 @@ class Command(BaseCommand):
                 "use 0 for no limit; default: %(default)d"
             ),
         )
+        parser.add_argument(
+            "--profile",
+            action="store_true",
+            help=(
+                "measure wall time, CPU time, bytes and items processed by each stage of the import "
+                "and report them together with the files that took longest to parse"
+            ),
+        )
+        parser.add_argument(
+            "--profile-output",
+            metavar="FILE",
+            type=Path,
+            help=(
+                "with --profile, also run cProfile and store its statistics in FILE for use with pstats; "
+                "with --jobs, this covers only the writer process"
+            ),
+        )
+        parser.add_argument(
+            "--swap",
+            action="store_true",
+            help=(
+                "import all documents into shadow tables, build their indexes and then replace the "
+                "current documents in a single transaction so searches never see a partial import"
+            ),
+        )
 
     def handle(self, *args, **options):
         self._base_dir: Path = options["base_dir"]
+        self._batch_memory: int = options["batch_memory"] * _BYTES_PER_MB
+        if self._batch_memory < 1:
+            raise CommandError(f"--batch-memory must be at least 1 but is {options['batch_memory']}")
+        self._is_hashing: bool = options["hash"]
+        self._is_incremental: bool = options["incremental"]
+        self._is_swapping: bool = options["swap"]
+        if self._is_incremental and self._is_swapping:
+            raise CommandError("--incremental and --swap cannot be used together")
+        self._jobs: int = options["jobs"] or os.cpu_count() or 1
+        self._loader_name: str = options["loader"]
+        # The option is a string so empty can be told apart, which Path would turn into ".".
+        self._manifest_path: Optional[Path] = Path(options["manifest"]) if options["manifest"] else None
         self._max_count: int = options["max_count"]
+        self._max_length: int = options["max_length"]
         warning_codes_to_ignore: str = options["ignore"] or ""
         self._warning_codes_to_ignore = [code.strip() for code in warning_codes_to_ignore.split(",")]
+        self._reported_unknown_language_messages = set()
+        self._id_to_existing_content_hash_map = {}
+        profile_output_path: Optional[Path] = options["profile_output"]
+        if profile_output_path is not None and not options["profile"]:
+            raise CommandError("--profile-output requires --profile")
+        self._profile = StageProfile() if options["profile"] else None
+        self._slowest_parse_times = []
+        profiler = cProfile.Profile() if profile_output_path is not None else None
         self.stdout.write(f"Scanning {self._base_dir}")
 
-        self._id_to_text_path_map = self._id_to_path_map("[0-9]*-8.txt")
-        self._id_to_html_path_map = self._id_to_path_map("[0-9]*-h.htm")
-        self._import_documents()
+        start_time = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            self._scan_document_files()
+            self._import_documents()
+            # Make cached search results from before the import unreachable.
+            bump_index_generation()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        duration = time.perf_counter() - start_time
         document_count = Document.objects.count()
+        self.stdout.write(f"  Peak batch memory: {self._peak_batch_memory / _BYTES_PER_MB:.1f} MB")
+        if self._profile is not None:
+            self._write_profile(duration)
+        if profiler is not None:
+            profiler.dump_stats(profile_output_path)
+            self.stdout.write(f"  Wrote cProfile statistics to {profile_output_path}")
         self.stdout.write(self.style.SUCCESS(f"Successfully imported {document_count} documents"))
 
-    def _id_to_path_map(self, name_pattern: str) -> Dict[int, Path]:
-        self.stdout.write(f"  Scanning for {name_pattern} document files")
-        result = {}
-        pattern = "**" + os.sep + name_pattern
-        for document_path in self._base_dir.rglob(pattern):
-            document_name = document_path.name
-            name_match = _DOCUMENT_ID_REGEX.match(document_name)
-            if name_match is not None:
-                document_id = name_match.group("id")
-                result[document_id] = document_path
-        self.stdout.write(f"    Found {len(result)} document files")
-        return result
+    def _scan_document_files(self):
+        with stage_of(self._profile, "scan files") as stage:
+            scan_result = scanned_document_files(self._base_dir, self._manifest_path)
+            stage.count = len(scan_result.id_to_text_file_map) + len(scan_result.id_to_html_file_map)
+        self._id_to_text_file_map = scan_result.id_to_text_file_map
+        self._id_to_html_file_map = scan_result.id_to_html_file_map
+        self.stdout.write(
+            f"  Found {len(self._id_to_text_file_map)} text and {len(self._id_to_html_file_map)} HTML document "
+            f"files, listed {scan_result.changed_directory_count} of {scan_result.directory_count} directories"
+        )
 
     def _import_documents(self):
-        document_ids_to_add = sorted(self._id_to_text_path_map.keys() & self._id_to_html_path_map.keys())
+        document_ids_to_add = sorted(self._id_to_text_file_map.keys() & self._id_to_html_file_map.keys())
         if self._max_count >= 1:
             document_ids_to_add = document_ids_to_add[: self._max_count]
-        documents_to_add = []
-        Document.objects.all().delete()
-        for document_id in tracked_progress(document_ids_to_add, description="  Importing documents"):
-            try:
-                document_to_add = self._document_from_id(document_id)
-                if document_to_add is not None:
-                    documents_to_add.append(document_to_add)
-            except CommandError as error:
-                self.stdout.write(f"Warning: {error}")
-            if len(documents_to_add) >= _BATCH_SIZE:
-                Document.objects.bulk_create(documents_to_add)
-                documents_to_add.clear()
-        Document.objects.bulk_create(documents_to_add)
-
-    def _document_from_id(self, document_id: int) -> Optional[Document]:
-        result = None
-        text_path = self._id_to_text_path_map[document_id]
-        full_text = self._full_text_from(text_path)
-        full_text_length = len(full_text)
-        if full_text_length <= self._max_length or self._max_length <= 0:
-            html_path = self._id_to_html_path_map[document_id]
-            html = self._full_text_from(html_path)
-            if html is not None:
-                intro_lines, text_lines = self._intro_and_text_lines(text_path, full_text)
-                title, authors, language = _title_authors_language_from(intro_lines)
-                language_code = self._language_code(text_path, language)
-                text = "\n".join(text_lines).strip(" \n\t")
-                result = Document(
-                    id=document_id,
-                    authors=authors,
-                    html=html,
-                    language_code=language_code,
-                    text=text,
-                    title=title,
-                )
+        shadow_tables = None
+        if self._is_incremental:
+            with stage_of(self._profile, "find changed documents", count=len(document_ids_to_add)):
+                document_ids_to_add = self._changed_document_ids(document_ids_to_add)
+        elif self._is_swapping:
+            shadow_tables = ShadowTables([Document, DocumentHtml, Passage])
+            shadow_tables.create()
+            self._document_model = shadow_tables.shadow_model(Document)
+            self._document_html_model = shadow_tables.shadow_model(DocumentHtml)
+            self._passage_model = shadow_tables.shadow_model(Passage)
         else:
-            full_text_length_in_mb = full_text_length / 1024 / 1024
-            self._log_document_warning(
-                text_path, WARNING_FILE_TOO_LARGE, f"Skipping too long file: {full_text_length_in_mb:.2f} MB"
-            )
-        return result
-
-    def _log_document_warning(self, path: Path, code, message: str):
-        if code not in self._warning_codes_to_ignore:
-            _log.warning("%s: %s %s", path.name, code, message)
-
-    def _full_text_from(self, path: Path) -> str:
+            truncate([DocumentHtml, Passage, Document])
         try:
-            with open(path, "rb") as text_file:
-                content = text_file.read().replace(b"\r\n", b"\n").replace(b"\r", b"\n")
-        except Exception as error:
-            raise CommandError(f'Cannot process "{path}": {error}')
-
-        actual_encoding = None
-        result = content.decode(DEFAULT_ENCODING, errors="replace")
-        for line in result.split("\n"):
-            if _START_EBOOK_MARKER_REGEX.match(line) is not None or _END_EBOOK_MARKER_REGEX.match(line) is not None:
-                break
-            if line.startswith(_ENCODING_MARKER):
-                actual_encoding = _text_after_colon(line).lower()
-                actual_encoding = _CP_HYPHEN_REGEX.sub("cp", actual_encoding)
-                mapped_broken_encoding = _BROKEN_ENCODING_TO_ENCODING_MAP.get(actual_encoding)
-                if mapped_broken_encoding is not None:
-                    self._log_document_warning(
-                        path,
-                        WARNING_MAPPING_BROKEN_ENCODING,
-                        f"Mapping broken encoding {actual_encoding!r} to {mapped_broken_encoding!r}",
+            self._add_parsed_documents(document_ids_to_add)
+            if shadow_tables is not None:
+                self._swap_in(shadow_tables)
+        except BaseException:
+            if shadow_tables is not None:
+                shadow_tables.drop()
+            raise
+
+    def _add_parsed_documents(self, document_ids_to_add: List[int]):
+        self._loader = LOADER_CLASSES[self._loader_name](self._document_model, upsert=self._is_incremental)
+        self._document_html_loader = LOADER_CLASSES[self._loader_name](
+            self._document_html_model, upsert=self._is_incremental
+        )
+        self._passage_loader = LOADER_CLASSES[self._loader_name](self._passage_model)
+        documents_to_add = []
+        document_htmls_to_add = []
+        passages_to_add = []
+        documents_with_same_content = []
+        batch_memory = 0
+        parse_results = tracked_progress(
+            self._parse_results(document_ids_to_add),
+            description="  Importing documents",
+            total=len(document_ids_to_add),
+        )
+        for parse_result in parse_results:
+            for warning in parse_result.warnings:
+                self._log_document_warning(warning)
+            if parse_result.error is not None:
+                self.stdout.write(f"Warning: {parse_result.error}")
+            if parse_result.profile is not None:
+                self._add_parse_profile(parse_result)
+            if parse_result.document is not None and self._has_same_content(parse_result.document):
+                documents_with_same_content.append(
+                    self._document_model(id=parse_result.document_id, **self._source_fields(parse_result.document_id))
+                )
+            elif parse_result.document is not None:
+                document_fields = parse_result.document._asdict()
+                compressed_html = document_fields.pop("compressed_html")
+                passage_ends = document_fields.pop("passage_ends")
+                text = document_fields.pop("text")
+                document_id = parse_result.document.id
+                documents_to_add.append(self._document_model(**document_fields, **self._source_fields(document_id)))
+                document_htmls_to_add.append(
+                    self._document_html_model(document_id=document_id, compressed_html=compressed_html)
+                )
+                passage_texts = passages_from(text, passage_ends)
+                passages_to_add.extend(
+                    self._passage_model(
+                        document_id=document_id,
+                        ordinal=ordinal,
+                        language_code=parse_result.document.language_code,
+                        text=passage_text,
                     )
-                    actual_encoding = mapped_broken_encoding
-                break
-        if actual_encoding is None:
-            actual_encoding = DEFAULT_ENCODING
-            self._log_document_warning(
-                path, WARNING_CANNOT_DETERMINE_ENCODING, f"Cannot determine encoding, using default {actual_encoding}"
-            )
-
-        if actual_encoding != DEFAULT_ENCODING:
-            try:
-                result = content.decode(actual_encoding, errors="replace")
-            except LookupError:
-                self._log_document_warning(
-                    path,
-                    WARNING_UNKNOWN_PYTHON_ENCODING,
-                    f"Cannot find Python encoding for {actual_encoding!r}, using default encoding",
+                    for ordinal, passage_text in enumerate(passage_texts)
                 )
-
-        result = result.strip(" \n\t")
-        return result
-
-    def _intro_and_text_lines(self, path: Path, full_text: str) -> Tuple[List[str], List[str]]:
-        intro_lines = []
-        text_lines = []
-        state = _TextScannerState.BEFORE_TEXT
-        lines = full_text.split("\n")
-        line_count = len(lines)
-        line_index = 0
-        while line_index < line_count and state != _TextScannerState.AFTER_TEXT:
-            line = lines[line_index]
-            if state == _TextScannerState.BEFORE_TEXT:
-                if _START_EBOOK_MARKER_REGEX.match(line) is not None:
-                    state = _TextScannerState.IN_TEXT
-                else:
-                    intro_lines.append(line)
-            elif state == _TextScannerState.IN_TEXT:
-                if _END_EBOOK_MARKER_REGEX.match(line) is not None:
-                    state = _TextScannerState.AFTER_TEXT
-                else:
-                    text_lines.append(line)
-            line_index += 1
-
-        if state == _TextScannerState.BEFORE_TEXT:
-            self._log_document_warning(
-                path,
-                WARNING_NO_START_MARKER_FOUND,
-                "No gutenberg start marker found, document is considered to be empty",
+                batch_memory += _payload_size(parse_result.document, passage_texts)
+            if batch_memory >= self._batch_memory:
+                self._add_documents(documents_to_add, document_htmls_to_add, passages_to_add, batch_memory)
+                documents_to_add.clear()
+                document_htmls_to_add.clear()
+                passages_to_add.clear()
+                batch_memory = 0
+        self._add_documents(documents_to_add, document_htmls_to_add, passages_to_add, batch_memory)
+        if documents_with_same_content:
+            self.stdout.write(
+                f"  Updating only the modification time of {len(documents_with_same_content)} documents "
+                f"with unchanged content"
             )
-        elif state == _TextScannerState.IN_TEXT:
-            self._log_document_warning(
-                path,
-                WARNING_NO_END_MARKER_FOUND,
-                "No gutenberg end marker found, document might include unwanted suffix lines",
+            self._document_model.objects.bulk_update(
+                documents_with_same_content, _SOURCE_STAT_FIELDS, batch_size=_BATCH_SIZE
             )
-        else:
-            assert state == _TextScannerState.AFTER_TEXT
 
-        return intro_lines, text_lines
+    def _has_same_content(self, document: ParsedDocument) -> bool:
+        existing_content_hash = self._id_to_existing_content_hash_map.pop(document.id, "")
+        return existing_content_hash != "" and existing_content_hash == document.content_hash
 
-    def _language_code(self, path: Path, language: str) -> str:
-        language_lower = language.lower()
-        is_single_language = _SINGLE_LANGUAGE_REGEX.match(language_lower) is not None
-        result = _LANGUAGE_TO_LANGUAGE_CODE_MAP.get(language) if len(language) != 2 else language_lower
-        if result is None:
-            cleaned_language = language.title()
-            result = _LANGUAGE_TO_LANGUAGE_CODE_MAP.get(cleaned_language)
-            if result is None:
-                result = UNKNOWN_LANGUAGE_CODE
-                if cleaned_language in _NO_ISO_LANGUAGES:
-                    self._log_document_warning(
-                        path,
-                        WARNING_NO_ISO_LANGUAGE,
-                        f"Language {language!r} has no ISO-639-1 code, treating as unknown language",
-                    )
-                elif not is_single_language:
-                    self._log_document_warning(
-                        path,
-                        WARNING_MULTIPLE_LANGUAGES,
-                        f"Document is written in multiple languages, treating as unknown language: {language!r}",
-                    )
-                elif cleaned_language not in _unknown_languages:
-                    _unknown_languages.add(cleaned_language)
-                    self._log_document_warning(
-                        path,
-                        WARNING_UNKNOWN_LANGUAGE,
-                        f"Unknown language {cleaned_language!r} should be added to _LANGUAGE_TO_LANGUAGE_CODE_MAP "
-                        f"or _NO_ISO_LANGUAGES",
-                    )
+    def _parse_results(self, document_ids: List[int]) -> Iterator[ParseResult]:
+        paths_to_parse = (
+            (document_id, self._id_to_text_file_map[document_id].path, self._id_to_html_file_map[document_id].path)
+            for document_id in document_ids
+        )
+        is_profiling = self._profile is not None
+        if self._jobs <= 1:
+            parser = DocumentParser(self._max_length, is_profiling, self._is_hashing)
+            for document_id, text_path, html_path in paths_to_parse:
+                yield parser.parse(document_id, text_path, html_path)
+        else:
+            # Submit only a limited number of documents ahead so parsed documents waiting for
+            # the single writer do not pile up in memory. Results are yielded in submission order.
+            with ProcessPoolExecutor(
+                max_workers=self._jobs,
+                initializer=init_worker,
+                initargs=(self._max_length, is_profiling, self._is_hashing),
+            ) as executor:
+                pending_results = deque()
+                for document_id, text_path, html_path in paths_to_parse:
+                    if len(pending_results) >= self._jobs * _PARSE_AHEAD_PER_JOB:
+                        yield self._next_parse_result(pending_results)
+                    pending_results.append(executor.submit(parse_in_worker, document_id, text_path, html_path))
+                while pending_results:
+                    yield self._next_parse_result(pending_results)
+
+    def _next_parse_result(self, pending_results: deque) -> ParseResult:
+        # Time the writer spends waiting tells if more jobs would help.
+        with stage_of(self._profile, "wait for workers"):
+            return pending_results.popleft().result()
+
+    def _changed_document_ids(self, document_ids: List[int]) -> List[int]:
+        """
+        The ids of new documents and documents whose files changed. Documents whose files do not
+        exist anymore are deleted. With ``--hash``, the hashes of documents whose files changed are
+        remembered so that documents whose files were only touched are not stored again once the
+        parser has hashed them.
+        """
+        result = []
+        id_to_existing_source_fields_map = {
+            existing_fields[0]: existing_fields[1:]
+            for existing_fields in Document.objects.values_list("id", *_SOURCE_STAT_FIELDS, "content_hash")
+        }
+        self._delete_documents(
+            id_to_existing_source_fields_map.keys()
+            - (self._id_to_text_file_map.keys() & self._id_to_html_file_map.keys())
+        )
+        for document_id in document_ids:
+            existing_source_fields = id_to_existing_source_fields_map.get(document_id)
+            source_fields = self._source_fields(document_id)
+            if existing_source_fields is None:
+                result.append(document_id)
+            elif existing_source_fields[:-1] != tuple(source_fields[field] for field in _SOURCE_STAT_FIELDS):
+                if self._is_hashing:
+                    self._id_to_existing_content_hash_map[document_id] = existing_source_fields[-1]
+                result.append(document_id)
+        unchanged_document_count = len(document_ids) - len(result)
+        self.stdout.write(
+            f"  Skipping {unchanged_document_count} unchanged documents, importing {len(result)} documents"
+        )
         return result
 
+    def _delete_documents(self, document_ids: Set[int]):
+        self.stdout.write(f"  Deleting {len(document_ids)} documents whose files do not exist anymore")
+        document_ids_to_delete = sorted(document_ids)
+        for start in range(0, len(document_ids_to_delete), _DELETE_BATCH_SIZE):
+            document_ids_batch = document_ids_to_delete[start : start + _DELETE_BATCH_SIZE]
+            # Only the ids are needed to delete the documents and their passages.
+            Document.objects.filter(id__in=document_ids_batch).only("id").delete()
+
+    def _source_fields(self, document_id: int) -> Dict[str, Any]:
+        text_file = self._id_to_text_file_map[document_id]
+        html_file = self._id_to_html_file_map[document_id]
+        return {
+            "text_path": str(text_file.path.relative_to(self._base_dir)),
+            "text_size": text_file.size,
+            "text_mtime_ns": text_file.mtime_ns,
+            "html_path": str(html_file.path.relative_to(self._base_dir)),
+            "html_size": html_file.size,
+            "html_mtime_ns": html_file.mtime_ns,
+        }
+
+    def _add_documents(
+        self, documents: List[Document], document_htmls: List[DocumentHtml], passages: List[Passage], batch_memory: int
+    ):
+        self._peak_batch_memory = max(self._peak_batch_memory, batch_memory)
+        with stage_of(self._profile, "store documents", count=len(documents)):
+            self._loader.load(documents)
+        with stage_of(self._profile, "store HTML", count=len(document_htmls)) as stage:
+            self._document_html_loader.load(document_htmls)
+            stage.byte_count = sum(len(document_html.compressed_html) for document_html in document_htmls)
+        if self._is_incremental:
+            with stage_of(self._profile, "delete changed passages", count=len(documents)):
+                # Changed documents replace all their previous passages.
+                Passage.objects.filter(document_id__in=[document.id for document in documents]).delete()
+        with stage_of(self._profile, "store passages", count=len(passages)) as stage:
+            self._passage_loader.load(passages)
+            stage.byte_count = sum(len(passage.text) for passage in passages)
+        if not self._is_swapping:
+            with stage_of(self._profile, "update search vectors", count=len(documents)):
+                update_search_vectors(document.id for document in documents)
+
+    def _swap_in(self, shadow_tables: ShadowTables):
+        # Computing all search vectors in one statement and building the indexes only afterwards is
+        # considerably faster than maintaining them for each batch.
+        self.stdout.write("  Computing search vectors")
+        with stage_of(self._profile, "update search vectors") as stage:
+            stage.count = self._document_model.objects.update(search_vector=document_search_vector())
+            self._passage_model.objects.update(search_vector=passage_search_vector())
+        self.stdout.write("  Building indexes")
+        with stage_of(self._profile, "build indexes"):
+            shadow_tables.build_indexes()
+            shadow_tables.analyze()
+        self.stdout.write("  Replacing documents")
+        with stage_of(self._profile, "swap tables"):
+            shadow_tables.swap()
+
+    def _add_parse_profile(self, parse_result: ParseResult):
+        self._profile.merge(parse_result.profile)
+        parse_time = (parse_result.profile.wall_seconds, parse_result.document_id)
+        if len(self._slowest_parse_times) < _SLOWEST_FILE_COUNT:
+            heapq.heappush(self._slowest_parse_times, parse_time)
+        else:
+            heapq.heappushpop(self._slowest_parse_times, parse_time)
+
+    def _write_profile(self, duration: float):
+        self.stdout.write(f"  Profile of {duration:.1f} seconds:")
+        self.stdout.write(f"    {'stage':<25} {'items':>9} {'wall s':>9} {'CPU s':>9} {'MB':>9} {'MB/s':>8}")
+        for name, stats in self._profile.items():
+            megabytes = stats.byte_count / _BYTES_PER_MB
+            megabytes_per_second = megabytes / stats.wall_seconds if stats.wall_seconds > 0 else 0.0
+            self.stdout.write(
+                f"    {name:<25} {stats.count:>9} {stats.wall_seconds:>9.2f} {stats.cpu_seconds:>9.2f} "
+                f"{megabytes:>9.1f} {megabytes_per_second:>8.1f}"
+            )
+        if self._jobs > 1:
+            self.stdout.write(
+                f"    Parsing stages ran in {self._jobs} worker processes, so their times can add up to more "
+                f"than the duration."
+            )
+        if self._slowest_parse_times:
+            self.stdout.write("  Slowest files to parse:")
+            for parse_seconds, document_id in sorted(self._slowest_parse_times, reverse=True):
+                text_file = self._id_to_text_file_map[document_id]
+                self.stdout.write(
+                    f"    {parse_seconds:>7.3f} s {text_file.size / _BYTES_PER_MB:>7.1f} MB  {text_file.path}"
+                )
 
-def _title_authors_language_from(intro_lines: List[str]) -> Tuple[str, str, str]:
-    title = ""
-    authors = ""
-    language = ""
-    intro_line_count = len(intro_lines)
-    intro_line_index = 0
-    while intro_line_index < intro_line_count and (not title or not authors or not language):
-        intro_line = intro_lines[intro_line_index]
-        if intro_line.startswith("Author:"):
-            authors = _text_after_colon(intro_line)
-        elif intro_line.startswith("Language:"):
-            language = _text_after_colon(intro_line)
-        elif intro_line.startswith("Title:"):
-            title = _text_after_colon(intro_line)
-        intro_line_index += 1
-    return title, authors, language
-
-
-def _text_after_colon(line: str) -> str:
-    return line.split(":", 1)[1].split("<", 1)[0].strip()
+    def _log_document_warning(self, warning: DocumentWarning):
+        if warning.code not in self._warning_codes_to_ignore:
+            if warning.code == WARNING_UNKNOWN_LANGUAGE:
+                # Report each unknown language only once, independent of the process that found it.
+                if warning.message in self._reported_unknown_language_messages:
+                    return
+                self._reported_unknown_language_messages.add(warning.message)
+            _log.warning("%s: %s %s", warning.path.name, warning.code, warning.message)
+
+
+def _payload_size(document: ParsedDocument, passage_texts: List[str]) -> int:
+    """
+    Approximate memory used by the bulky parts of ``document`` and its passages while they wait to be stored.
+    """
+    return (
+        sys.getsizeof(document.text)
+        + sys.getsizeof(document.compressed_html)
+        + sum(sys.getsizeof(passage_text) for passage_text in passage_texts)
+    )
@@ -0,0 +1,39 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def _update_search_vectors(apps, schema_editor):
+    document_model = apps.get_model("gutensearch", "Document")
+    document_model.objects.update(
+        search_vector=(
+            SearchVector("title", config="simple", weight="A")
+            + SearchVector("authors", config="simple", weight="B")
+            + SearchVector("text", config="simple", weight="C")
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gutensearch", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False,
+                help_text="Preprocessed title, authors and text for indexed full text search",
+                null=True,
+                verbose_name="search vector",
+            ),
+        ),
+        migrations.RunPython(_update_search_vectors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="document",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["search_vector"], name="document_search_vector_idx"),
+        ),
+    ]
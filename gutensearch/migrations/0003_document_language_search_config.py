@@ -0,0 +1,69 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import BtreeGinExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Case, CharField, Value, When
+
+# Copies of the search configurations in gutensearch.search at the time of this migration, so later
+# changes there do not change what this migration does.
+_DEFAULT_SEARCH_CONFIG = "simple"
+_LANGUAGE_CODE_TO_SEARCH_CONFIG_MAP = {
+    "ar": "arabic",
+    "da": "danish",
+    "de": "german",
+    "el": "greek",
+    "en": "english",
+    "es": "spanish",
+    "fi": "finnish",
+    "fr": "french",
+    "ga": "irish",
+    "hu": "hungarian",
+    "it": "italian",
+    "nl": "dutch",
+    "no": "norwegian",
+    "pt": "portuguese",
+    "ru": "russian",
+    "sv": "swedish",
+}
+
+
+def _document_search_vector() -> SearchVector:
+    search_config = Case(
+        *[
+            When(language_code=language_code, then=Value(search_config))
+            for language_code, search_config in _LANGUAGE_CODE_TO_SEARCH_CONFIG_MAP.items()
+        ],
+        default=Value(_DEFAULT_SEARCH_CONFIG),
+        output_field=CharField(),
+    )
+    return (
+        SearchVector("title", config=search_config, weight="A")
+        + SearchVector("authors", config=search_config, weight="B")
+        + SearchVector("text", config=search_config, weight="C")
+    )
+
+
+def _update_search_vectors(apps, schema_editor):
+    document_model = apps.get_model("gutensearch", "Document")
+    document_model.objects.update(search_vector=_document_search_vector())
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gutensearch", "0002_document_search_vector"),
+    ]
+
+    operations = [
+        BtreeGinExtension(),
+        migrations.RemoveIndex(
+            model_name="document",
+            name="document_search_vector_idx",
+        ),
+        migrations.RunPython(_update_search_vectors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="document",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["language_code", "search_vector"], name="document_language_search_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gutensearch", "0004_document_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text='SHA-256 of the text and HTML file if imported with "--hash"',
+                max_length=64,
+                verbose_name="content hash",
+            ),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="html_mtime_ns",
+            field=models.BigIntegerField(default=0, editable=False, verbose_name="HTML modification time"),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="html_path",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Path of the HTML file relative to the import base directory",
+                max_length=1024,
+                verbose_name="HTML path",
+            ),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="html_size",
+            field=models.BigIntegerField(default=0, editable=False, verbose_name="HTML size"),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="text_mtime_ns",
+            field=models.BigIntegerField(default=0, editable=False, verbose_name="text modification time"),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="text_path",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Path of the text file relative to the import base directory",
+                max_length=1024,
+                verbose_name="text path",
+            ),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="text_size",
+            field=models.BigIntegerField(default=0, editable=False, verbose_name="text size"),
+        ),
+    ]
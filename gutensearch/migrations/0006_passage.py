@@ -0,0 +1,157 @@
+from typing import Iterator
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models import Case, CharField, Value, When
+
+_BATCH_SIZE = 100
+
+# Copies of the passage splitting in gutensearch.gutenberg and the search configurations in
+# gutensearch.search at the time of this migration, so later changes there do not change what this
+# migration does.
+_MAX_PASSAGE_LENGTH = 8 * 1024
+_DEFAULT_SEARCH_CONFIG = "simple"
+_LANGUAGE_CODE_TO_SEARCH_CONFIG_MAP = {
+    "ar": "arabic",
+    "da": "danish",
+    "de": "german",
+    "el": "greek",
+    "en": "english",
+    "es": "spanish",
+    "fi": "finnish",
+    "fr": "french",
+    "ga": "irish",
+    "hu": "hungarian",
+    "it": "italian",
+    "nl": "dutch",
+    "no": "norwegian",
+    "pt": "portuguese",
+    "ru": "russian",
+    "sv": "swedish",
+}
+
+
+def _passages_from(text: str) -> Iterator[str]:
+    """
+    The non empty passages of ``text``, which end at the last paragraph break within
+    ``_MAX_PASSAGE_LENGTH`` characters or, failing that, the last line break or space.
+    """
+    text_length = len(text)
+    passage_start = 0
+    while passage_start < text_length:
+        if text_length - passage_start > _MAX_PASSAGE_LENGTH:
+            limit = passage_start + _MAX_PASSAGE_LENGTH
+            min_end = passage_start + _MAX_PASSAGE_LENGTH // 2
+            passage_end = -1
+            for separator in ("\n\n", "\n", " "):
+                passage_end = text.rfind(separator, min_end, limit)
+                if passage_end != -1:
+                    break
+            if passage_end == -1:
+                passage_end = limit
+        else:
+            passage_end = text_length
+        passage = text[passage_start:passage_end].strip()
+        if passage:
+            yield passage
+        passage_start = passage_end
+
+
+def _search_config() -> Case:
+    return Case(
+        *[
+            When(language_code=language_code, then=Value(search_config))
+            for language_code, search_config in _LANGUAGE_CODE_TO_SEARCH_CONFIG_MAP.items()
+        ],
+        default=Value(_DEFAULT_SEARCH_CONFIG),
+        output_field=CharField(),
+    )
+
+
+def _split_documents_into_passages(apps, schema_editor):
+    document_model = apps.get_model("gutensearch", "Document")
+    passage_model = apps.get_model("gutensearch", "Passage")
+    documents = document_model.objects.only("id", "language_code", "text").iterator(chunk_size=_BATCH_SIZE)
+    for document in documents:
+        passage_model.objects.bulk_create(
+            passage_model(document_id=document.id, ordinal=ordinal, language_code=document.language_code, text=text)
+            for ordinal, text in enumerate(_passages_from(document.text))
+        )
+    search_config = _search_config()
+    document_model.objects.update(
+        search_vector=SearchVector("title", config=search_config, weight="A")
+        + SearchVector("authors", config=search_config, weight="B")
+    )
+    passage_model.objects.update(search_vector=SearchVector("text", config=search_config, weight="C"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gutensearch", "0005_document_source_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="document",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False,
+                help_text="Preprocessed title and authors for indexed full text search",
+                null=True,
+                verbose_name="search vector",
+            ),
+        ),
+        migrations.CreateModel(
+            name="Passage",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "ordinal",
+                    models.PositiveIntegerField(
+                        help_text="Position of the passage within the document starting with 0", verbose_name="ordinal"
+                    ),
+                ),
+                (
+                    "language_code",
+                    models.CharField(
+                        blank=True,
+                        help_text="Same as the language code of the document",
+                        max_length=2,
+                        verbose_name="language code",
+                    ),
+                ),
+                ("text", models.TextField(blank=True, verbose_name="text")),
+                (
+                    "search_vector",
+                    django.contrib.postgres.search.SearchVectorField(
+                        editable=False,
+                        help_text="Preprocessed text for indexed full text search",
+                        null=True,
+                        verbose_name="search vector",
+                    ),
+                ),
+                (
+                    "document",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="passages",
+                        to="gutensearch.document",
+                        verbose_name="document",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "passage",
+                "verbose_name_plural": "passages",
+                "indexes": [
+                    django.contrib.postgres.indexes.GinIndex(
+                        fields=["language_code", "search_vector"], name="passage_language_search_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(_split_documents_into_passages, migrations.RunPython.noop),
+    ]
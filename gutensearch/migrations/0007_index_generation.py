@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gutensearch", "0006_passage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndexGeneration",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("generation", models.PositiveBigIntegerField(default=0, verbose_name="generation")),
+                ("imported_at", models.DateTimeField(null=True, verbose_name="imported at")),
+            ],
+            options={
+                "verbose_name": "index generation",
+                "verbose_name_plural": "index generations",
+            },
+        ),
+    ]
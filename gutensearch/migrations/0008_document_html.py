@@ -0,0 +1,76 @@
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+_BATCH_SIZE = 100
+
+# Copy of gutensearch.gutenberg.HTML_COMPRESSION_LEVEL at the time of this migration.
+_HTML_COMPRESSION_LEVEL = 6
+
+
+def _compress_document_html(apps, schema_editor):
+    document_model = apps.get_model("gutensearch", "Document")
+    document_html_model = apps.get_model("gutensearch", "DocumentHtml")
+    documents = document_model.objects.only("id", "html").iterator(chunk_size=_BATCH_SIZE)
+    document_htmls = []
+    for document in documents:
+        document_htmls.append(
+            document_html_model(
+                document_id=document.id,
+                compressed_html=zlib.compress(document.html.encode("utf-8"), _HTML_COMPRESSION_LEVEL),
+            )
+        )
+        if len(document_htmls) >= _BATCH_SIZE:
+            document_html_model.objects.bulk_create(document_htmls)
+            document_htmls.clear()
+    document_html_model.objects.bulk_create(document_htmls)
+
+
+def _decompress_document_html(apps, schema_editor):
+    document_model = apps.get_model("gutensearch", "Document")
+    document_html_model = apps.get_model("gutensearch", "DocumentHtml")
+    for document_html in document_html_model.objects.iterator(chunk_size=_BATCH_SIZE):
+        document_model.objects.filter(id=document_html.document_id).update(
+            html=zlib.decompress(document_html.compressed_html).decode("utf-8")
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gutensearch", "0007_index_generation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentHtml",
+            fields=[
+                (
+                    "document",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="document_html",
+                        serialize=False,
+                        to="gutensearch.document",
+                        verbose_name="document",
+                    ),
+                ),
+                (
+                    "compressed_html",
+                    models.BinaryField(
+                        help_text="HTML encoded as UTF-8 and compressed with zlib", verbose_name="compressed HTML"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "document HTML",
+                "verbose_name_plural": "document HTML",
+            },
+        ),
+        migrations.RunPython(_compress_document_html, _decompress_document_html),
+        migrations.RemoveField(
+            model_name="document",
+            name="html",
+        ),
+    ]
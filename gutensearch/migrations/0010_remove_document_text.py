@@ -0,0 +1,14 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gutensearch", "0009_document_prefix_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="document",
+            name="text",
+        ),
+    ]
@@ -1,8 +1,13 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils.translation import gettext_lazy as _
 
 MAX_TITLE_LENGTH = 2048
 MAX_AUTHOR_LENGTH = 2048
+MAX_PATH_LENGTH = 1024
+CONTENT_HASH_LENGTH = 64
 
 
 class Document(models.Model):
@@ -14,9 +19,116 @@ class Document(models.Model):
         help_text=_('ISO-639-1 language code or "??" if unknown'),
     )
     authors: str = models.CharField(blank=True, max_length=MAX_AUTHOR_LENGTH, verbose_name=_("authors"))
-    html: str = models.TextField(blank=True, verbose_name=_("HTML"), help_text=_("Used for display"))
-    text: str = models.TextField(blank=True, verbose_name=_("text"), help_text=_("Used for searching"))
+    # The text is only stored in passages, which keeps document rows small.
+    search_vector = SearchVectorField(
+        editable=False,
+        null=True,
+        verbose_name=_("search vector"),
+        help_text=_("Preprocessed title and authors for indexed full text search"),
+    )
+    text_path: str = models.CharField(
+        blank=True,
+        editable=False,
+        max_length=MAX_PATH_LENGTH,
+        verbose_name=_("text path"),
+        help_text=_("Path of the text file relative to the import base directory"),
+    )
+    text_size: int = models.BigIntegerField(default=0, editable=False, verbose_name=_("text size"))
+    text_mtime_ns: int = models.BigIntegerField(default=0, editable=False, verbose_name=_("text modification time"))
+    html_path: str = models.CharField(
+        blank=True,
+        editable=False,
+        max_length=MAX_PATH_LENGTH,
+        verbose_name=_("HTML path"),
+        help_text=_("Path of the HTML file relative to the import base directory"),
+    )
+    html_size: int = models.BigIntegerField(default=0, editable=False, verbose_name=_("HTML size"))
+    html_mtime_ns: int = models.BigIntegerField(default=0, editable=False, verbose_name=_("HTML modification time"))
+    content_hash: str = models.CharField(
+        blank=True,
+        editable=False,
+        max_length=CONTENT_HASH_LENGTH,
+        verbose_name=_("content hash"),
+        help_text=_('SHA-256 of the text and HTML file if imported with "--hash"'),
+    )
 
     class Meta:
+        indexes = [
+            GinIndex(fields=["language_code", "search_vector"], name="document_language_search_idx"),
+            GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="document_title_trigram_idx"),
+            GinIndex(OpClass(Upper("authors"), name="gin_trgm_ops"), name="document_authors_trigram_idx"),
+            # B-tree indexes for prefix searches with LIKE independent of the database collation.
+            models.Index(OpClass(Upper("title"), name="text_pattern_ops"), name="document_title_prefix_idx"),
+            models.Index(OpClass(Upper("authors"), name="text_pattern_ops"), name="document_authors_prefix_idx"),
+        ]
         verbose_name = _("document")
         verbose_name_plural = _("documents")
+
+
+class DocumentHtml(models.Model):
+    """
+    HTML to display a document. It is stored separately from the document and compressed because it
+    is large and only needed to show a single document.
+    """
+
+    document: Document = models.OneToOneField(
+        Document,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="document_html",
+        verbose_name=_("document"),
+    )
+    compressed_html: bytes = models.BinaryField(
+        verbose_name=_("compressed HTML"), help_text=_("HTML encoded as UTF-8 and compressed with zlib")
+    )
+
+    class Meta:
+        verbose_name = _("document HTML")
+        verbose_name_plural = _("document HTML")
+
+
+class Passage(models.Model):
+    """
+    Consecutive part of the text of a document with a bounded size so that its search vector stays small
+    and matches can point to the part of the document they were found in.
+    """
+
+    document: Document = models.ForeignKey(
+        Document, on_delete=models.CASCADE, related_name="passages", verbose_name=_("document")
+    )
+    ordinal: int = models.PositiveIntegerField(
+        verbose_name=_("ordinal"), help_text=_("Position of the passage within the document starting with 0")
+    )
+    language_code: str = models.CharField(
+        blank=True,
+        max_length=2,
+        verbose_name=_("language code"),
+        help_text=_("Same as the language code of the document"),
+    )
+    text: str = models.TextField(blank=True, verbose_name=_("text"))
+    search_vector = SearchVectorField(
+        editable=False,
+        null=True,
+        verbose_name=_("search vector"),
+        help_text=_("Preprocessed text for indexed full text search"),
+    )
+
+    class Meta:
+        indexes = [GinIndex(fields=["language_code", "search_vector"], name="passage_language_search_idx")]
+        verbose_name = _("passage")
+        verbose_name_plural = _("passages")
+
+
+class IndexGeneration(models.Model):
+    """
+    Single row counting the imports, which ``gutenlader`` increments at the end of each import. Caches
+    of search results include the generation in their keys, so results from before an import are never
+    used after it.
+    """
+
+    generation: int = models.PositiveBigIntegerField(default=0, verbose_name=_("generation"))
+    imported_at = models.DateTimeField(null=True, verbose_name=_("imported at"))
+
+    class Meta:
+        verbose_name = _("index generation")
+        verbose_name_plural = _("index generations")
@@ -0,0 +1,159 @@
+"""
+Keyset pagination for query sets ordered by a descending key and the ascending primary key.
+
+Unlike ``OFFSET``, which has to compute and skip all rows of the previous pages, a keyset page only
+needs the rows after (or before) the last row of the current page, so later pages are as fast as the
+first one.
+"""
+import json
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+_TOKEN_SALT = "gutensearch.pagination"
+
+
+class KeysetPage(NamedTuple):
+    items: List[Any]
+    next_token: Optional[str]
+    previous_token: Optional[str]
+
+
+def keyset_page(
+    queryset: QuerySet,
+    key_name: str,
+    page_size: int,
+    after_token: Optional[str] = None,
+    before_token: Optional[str] = None,
+) -> KeysetPage:
+    """
+    The page of ``queryset`` after the row ``after_token`` refers to, before the row ``before_token``
+    refers to or otherwise the first page. Rows are ordered by the field or annotation ``key_name`` in
+    descending order and by ``pk`` in ascending order. The tokens are opaque strings that can be used in
+    URLs; invalid tokens result in a :py:exc:`ValueError`.
+
+    The key is stored in the tokens as JSON, so it must compare equal to itself after the round trip.
+    For floating point keys, this requires ``double precision`` instead of ``real``.
+    """
+    page_queryset = _page_queryset(queryset, key_name, page_size, after_token, before_token)
+    return _keyset_page_from(list(page_queryset), key_name, page_size, after_token, before_token)
+
+
+async def akeyset_page(
+    queryset: QuerySet,
+    key_name: str,
+    page_size: int,
+    after_token: Optional[str] = None,
+    before_token: Optional[str] = None,
+) -> KeysetPage:
+    """
+    Same as :py:func:`keyset_page` but reading the rows asynchronously.
+    """
+    page_queryset = _page_queryset(queryset, key_name, page_size, after_token, before_token)
+    rows = [row async for row in page_queryset]
+    return _keyset_page_from(rows, key_name, page_size, after_token, before_token)
+
+
+def _page_queryset(
+    queryset: QuerySet, key_name: str, page_size: int, after_token: Optional[str], before_token: Optional[str]
+) -> QuerySet:
+    """
+    The rows of the page plus one more to tell if there is another page in the same direction. For the
+    page before ``before_token``, the rows are in reverse order.
+    """
+    assert page_size >= 1
+    assert after_token is None or before_token is None
+    if before_token is not None:
+        key, pk = _key_and_pk_from(before_token)
+        queryset = queryset.filter(Q(**{f"{key_name}__gt": key}) | Q(**{key_name: key, "pk__lt": pk}))
+        result = queryset.order_by(key_name, "-pk")
+    else:
+        if after_token is not None:
+            key, pk = _key_and_pk_from(after_token)
+            queryset = queryset.filter(Q(**{f"{key_name}__lt": key}) | Q(**{key_name: key, "pk__gt": pk}))
+        result = queryset.order_by(f"-{key_name}", "pk")
+    return result[: page_size + 1]
+
+
+def _keyset_page_from(
+    rows: List[Any], key_name: str, page_size: int, after_token: Optional[str], before_token: Optional[str]
+) -> KeysetPage:
+    if before_token is not None:
+        has_previous = len(rows) > page_size
+        items = rows[:page_size][::-1]
+        has_next = True
+    else:
+        has_next = len(rows) > page_size
+        items = rows[:page_size]
+        has_previous = after_token is not None
+    next_token = _token_for(items[-1], key_name) if has_next and items else None
+    previous_token = _token_for(items[0], key_name) if has_previous and items else None
+    return KeysetPage(items, next_token, previous_token)
+
+
+def approximate_count(queryset: QuerySet, max_exact_count: int) -> int:
+    """
+    The number of rows in ``queryset`` if it is at most ``max_exact_count``, otherwise the number
+    of rows estimated by the query planner (but at least ``max_exact_count``). This way the count stays
+    cheap even if a huge number of rows match.
+    """
+    result = queryset.order_by().values("pk")[:max_exact_count].count()
+    if result >= max_exact_count:
+        result = max(max_exact_count, estimated_count(queryset))
+    return result
+
+
+async def aapproximate_count(queryset: QuerySet, max_exact_count: int) -> int:
+    """
+    Same as :py:func:`approximate_count` but counting asynchronously.
+    """
+    result = await queryset.order_by().values("pk")[:max_exact_count].acount()
+    if result >= max_exact_count:
+        # Django has no asynchronous cursors, so EXPLAIN runs in a thread.
+        result = max(max_exact_count, await sync_to_async(estimated_count)(queryset))
+    return result
+
+
+def estimated_count(queryset: QuerySet) -> int:
+    """
+    The number of rows in ``queryset`` as estimated by the query planner without running the query.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"explain (format json) {sql}", params)
+        (plan,) = cursor.fetchone()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator counting query sets with :py:func:`approximate_count` so pages of large tables can be
+    shown without counting all their rows. Counts above ``max_exact_count`` are estimates.
+    """
+
+    max_exact_count = 10000
+
+    @cached_property
+    def count(self) -> int:
+        if isinstance(self.object_list, QuerySet):
+            return approximate_count(self.object_list, self.max_exact_count)
+        return super().count
+
+
+def _token_for(item: Any, key_name: str) -> str:
+    return signing.dumps([getattr(item, key_name), item.pk], salt=_TOKEN_SALT, compress=True)
+
+
+def _key_and_pk_from(token: str) -> Tuple[Any, int]:
+    try:
+        key, pk = signing.loads(token, salt=_TOKEN_SALT)
+    except (signing.BadSignature, TypeError, ValueError) as error:
+        raise ValueError(f"invalid page token: {token!r}") from error
+    return key, pk
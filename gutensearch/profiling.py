@@ -0,0 +1,82 @@
+"""
+Measuring the stages of an import with ``gutenlader --profile``.
+
+Like :py:mod:`gutensearch.gutenberg`, this module does not depend on Django so worker processes can
+measure their stages and send them back to the writer along with the parsed documents.
+"""
+import time
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, List, Optional, Tuple
+
+
+class StageStats:
+    """
+    Cumulative wall time, CPU time of the measuring process, bytes and items processed by a stage.
+    """
+
+    def __init__(self):
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.byte_count = 0
+        self.count = 0
+
+    def add(self, other: "StageStats"):
+        self.wall_seconds += other.wall_seconds
+        self.cpu_seconds += other.cpu_seconds
+        self.byte_count += other.byte_count
+        self.count += other.count
+
+
+class StageProfile:
+    """
+    :py:class:`StageStats` for each stage in the order the stages were first passed.
+    """
+
+    def __init__(self):
+        self._name_to_stats_map: Dict[str, StageStats] = {}
+
+    @contextmanager
+    def stage(self, name: str, byte_count: int = 0, count: int = 1) -> Iterator[StageStats]:
+        """
+        Measure the code in the ``with`` block as stage ``name`` processing ``count`` items. If the number
+        of bytes or items processed is known only afterwards, the block can set the ``byte_count`` and
+        ``count`` of the yielded measurement.
+        """
+        measurement = StageStats()
+        measurement.byte_count = byte_count
+        measurement.count = count
+        wall_start_time = time.perf_counter()
+        cpu_start_time = time.process_time()
+        try:
+            yield measurement
+        finally:
+            measurement.wall_seconds = time.perf_counter() - wall_start_time
+            measurement.cpu_seconds = time.process_time() - cpu_start_time
+            self.add(name, measurement)
+
+    def add(self, name: str, stats: StageStats):
+        existing_stats = self._name_to_stats_map.get(name)
+        if existing_stats is None:
+            existing_stats = StageStats()
+            self._name_to_stats_map[name] = existing_stats
+        existing_stats.add(stats)
+
+    def merge(self, other: "StageProfile"):
+        for name, stats in other.items():
+            self.add(name, stats)
+
+    def items(self) -> List[Tuple[str, StageStats]]:
+        return list(self._name_to_stats_map.items())
+
+    @property
+    def wall_seconds(self) -> float:
+        return sum(stats.wall_seconds for stats in self._name_to_stats_map.values())
+
+
+def stage_of(
+    profile: Optional[StageProfile], name: str, byte_count: int = 0, count: int = 1
+) -> ContextManager[StageStats]:
+    """
+    Measure stage ``name`` in ``profile``, or do nothing if ``profile`` is ``None``.
+    """
+    return profile.stage(name, byte_count, count) if profile is not None else nullcontext(StageStats())
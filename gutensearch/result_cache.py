@@ -0,0 +1,105 @@
+"""
+Cache for search result pages, facets and suggestions.
+
+Search results only change with an import, so the keys of cached pages include the current
+:py:class:`~gutensearch.models.IndexGeneration`, which ``gutenlader`` increments at the end of each
+import. This makes all cached pages from before an import unreachable, and the cache backend evicts
+them eventually.
+"""
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+
+from gutensearch.models import IndexGeneration
+from gutensearch.search import Facets, SearchMode
+
+#: Alias in ``settings.CACHES`` of the cache for search results.
+RESULT_CACHE_ALIAS = "search_results"
+
+_INDEX_GENERATION_PK = 1
+
+
+class SearchResultPage(NamedTuple):
+    document_ids: List[int]
+    id_to_snippet_map: Dict[int, str]
+    next_token: Optional[str]
+    previous_token: Optional[str]
+    result_count: Optional[int]
+
+
+async def aindex_generation() -> int:
+    result = await IndexGeneration.objects.filter(pk=_INDEX_GENERATION_PK).values_list("generation", flat=True).afirst()
+    return result or 0
+
+
+def bump_index_generation():
+    is_updated = IndexGeneration.objects.filter(pk=_INDEX_GENERATION_PK).update(
+        generation=F("generation") + 1, imported_at=timezone.now()
+    )
+    if not is_updated:
+        IndexGeneration.objects.create(pk=_INDEX_GENERATION_PK, generation=1, imported_at=timezone.now())
+
+
+async def acached_search_result_page(
+    search_term: str, options: Dict[str, Optional[str]], acompute_page: Callable[[], Awaitable[SearchResultPage]]
+) -> SearchResultPage:
+    """
+    The search result page for ``search_term`` and further ``options`` like the language and search mode
+    from the cache or, if it is not cached yet, computed by ``acompute_page``.
+    """
+    return await _acached("results", _search_key_data(search_term, options), acompute_page)
+
+
+async def acached_facets(
+    search_term: str, options: Dict[str, Optional[str]], acompute_facets: Callable[[], Awaitable[Optional[Facets]]]
+) -> Optional[Facets]:
+    """
+    The facets for ``search_term`` and further ``options`` like the language and search mode from the
+    cache or, if they are not cached yet, computed by ``acompute_facets``. Missing facets, for example
+    because they took too long to compute, are not cached.
+    """
+    return await _acached("facets", _search_key_data(search_term, options), acompute_facets)
+
+
+async def acached_suggestions(prefix: str, acompute_suggestions: Callable[[], Awaitable[List[str]]]) -> List[str]:
+    """
+    The suggestions for ``prefix`` from the cache or, if they are not cached yet, computed by
+    ``acompute_suggestions``.
+    """
+    # Suggestions ignore case but not whitespace, so only the case is normalized.
+    return await _acached("suggestions", prefix.upper(), acompute_suggestions)
+
+
+def normalized_search_term(search_term: str, search_mode: Optional[str]) -> str:
+    """
+    For full text search, ``search_term`` in lower case and with whitespace collapsed, so terms that only
+    differ in these share the same cached results. Other search modes can tell these terms apart, for
+    example the trigram similarity counts the spaces between words, so their terms are kept as they are.
+    """
+    if search_mode != SearchMode.FULLTEXT:
+        return search_term
+    return " ".join(search_term.lower().split())
+
+
+def _search_key_data(search_term: str, options: Dict[str, Optional[str]]) -> List[Any]:
+    return [normalized_search_term(search_term, options.get("search_mode")), options]
+
+
+async def _acached(kind: str, key_data: Any, acompute: Callable[[], Awaitable[Any]]) -> Any:
+    cache = caches[RESULT_CACHE_ALIAS]
+    key = _cache_key(kind, await aindex_generation(), key_data)
+    result = await cache.aget(key)
+    if result is None:
+        result = await acompute()
+        if result is not None:
+            await cache.aset(key, result)
+    return result
+
+
+def _cache_key(kind: str, generation: int, key_data: Any) -> str:
+    key_json = json.dumps([generation, key_data], sort_keys=True)
+    return f"gutensearch:{kind}:{hashlib.sha256(key_json.encode('utf-8')).hexdigest()}"
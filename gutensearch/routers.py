@@ -0,0 +1,113 @@
+"""
+Routing of read only views to replicas of the default database.
+
+Views decorated with :py:func:`read_from_replica` read from one of the databases named in
+``GUTENSEARCH_REPLICA_DATABASES`` while everything else, in particular imports and the admin, keeps using
+the default database. Replicas that cannot be connected to are skipped for
+``GUTENSEARCH_REPLICA_RETRY_IN_SECONDS``, and if no replica is available the default database is used.
+"""
+import functools
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+DEFAULT_REPLICA_RETRY_IN_SECONDS = 30
+
+_log = logging.getLogger(__name__)
+
+_current_replica_alias: ContextVar[Optional[str]] = ContextVar("replica_alias", default=None)
+
+_unhealthy_replicas_lock = threading.Lock()
+_replica_alias_to_retry_time_map: Dict[str, float] = {}
+
+
+class ReplicaRouter:
+    """
+    Database router sending reads of views decorated with :py:func:`read_from_replica` to the replica
+    chosen for the current request.
+    """
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        return _current_replica_alias.get()
+
+    def db_for_write(self, model, **hints) -> Optional[str]:
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        # Replicas contain the same rows as the default database.
+        database_aliases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in database_aliases and obj2._state.db in database_aliases:
+            return True
+        return None
+
+
+def replica_aliases() -> List[str]:
+    return getattr(settings, "GUTENSEARCH_REPLICA_DATABASES", [])
+
+
+def healthy_replica_alias() -> Optional[str]:
+    """
+    A random replica that can be connected to, or ``None`` if there is none.
+    """
+    now = time.monotonic()
+    with _unhealthy_replicas_lock:
+        candidate_aliases = [
+            alias for alias in replica_aliases() if _replica_alias_to_retry_time_map.get(alias, 0.0) <= now
+        ]
+    random.shuffle(candidate_aliases)
+    for alias in candidate_aliases:
+        connection = connections[alias]
+        try:
+            # ensure_connection() keeps a persistent connection without checking it, so one the replica
+            # dropped would only fail in the view. Like CONN_HEALTH_CHECKS, check it at most once per
+            # request, which also spares the view the check by CONN_HEALTH_CHECKS.
+            if connection.connection is not None and not connection.health_check_done:
+                if connection.is_usable():
+                    connection.health_check_done = True
+                else:
+                    connection.close()
+            connection.ensure_connection()
+        except OperationalError as error:
+            retry_in_seconds = getattr(
+                settings, "GUTENSEARCH_REPLICA_RETRY_IN_SECONDS", DEFAULT_REPLICA_RETRY_IN_SECONDS
+            )
+            _log.warning("skipping replica %s for %d seconds: %s", alias, retry_in_seconds, error)
+            with _unhealthy_replicas_lock:
+                _replica_alias_to_retry_time_map[alias] = now + retry_in_seconds
+        else:
+            return alias
+    return None
+
+
+def read_from_replica(view: Callable) -> Callable:
+    """
+    Decorator for views that only read from the database to do so from a healthy replica.
+    """
+    if iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def replica_reading_view(request, *args, **kwargs):
+            token = _current_replica_alias.set(await sync_to_async(healthy_replica_alias)())
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _current_replica_alias.reset(token)
+
+    else:
+
+        @functools.wraps(view)
+        def replica_reading_view(request, *args, **kwargs):
+            token = _current_replica_alias.set(healthy_replica_alias())
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _current_replica_alias.reset(token)
+
+    return replica_reading_view
@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional
+
+_MANIFEST_VERSION = 1
+
+_DOCUMENT_NAME_REGEX = re.compile(r"^(?P<id>\d+)-(?P<kind>8\.txt|h\.htm)$")
+_TEXT_KIND = "8.txt"
+
+_log = logging.getLogger(__name__)
+
+
+class DocumentFile(NamedTuple):
+    path: Path
+    size: int
+    mtime_ns: int
+
+
+class ScanResult(NamedTuple):
+    id_to_text_file_map: Dict[int, DocumentFile]
+    id_to_html_file_map: Dict[int, DocumentFile]
+    directory_count: int
+    changed_directory_count: int
+
+
+def scanned_document_files(base_dir: Path, manifest_path: Optional[Path] = None) -> ScanResult:
+    """
+    All Gutenberg text and HTML document files in ``base_dir`` found in a single walk.
+
+    With a ``manifest_path``, the directories, their document files and modification times are stored
+    there so later scans only have to list the directories whose modification time changed. Adding,
+    removing or renaming a file changes the modification time of its directory, which includes rsync
+    replacing a changed file by renaming a temporary file, but only with ``--omit-dir-times``. Otherwise
+    rsync sets the modification times of directories back to those on the mirror, as
+    ``scripts/rsync_gutenberg.sh`` avoids. Files changed in place, for example with ``rsync --inplace``,
+    leave the modification time of their directory unchanged and are only found without a manifest.
+    """
+    previous_directories = _directories_from_manifest(manifest_path, base_dir) if manifest_path else {}
+    directories = {}
+    id_to_text_file_map = {}
+    id_to_html_file_map = {}
+    changed_directory_count = 0
+    directories_to_scan = [("", os.stat(base_dir).st_mtime_ns)]
+    while directories_to_scan:
+        relative_folder, mtime_ns = directories_to_scan.pop()
+        directory = previous_directories.get(relative_folder)
+        if directory is None or directory["mtime_ns"] != mtime_ns:
+            directory = _scanned_directory(base_dir / relative_folder, mtime_ns)
+            changed_directory_count += 1
+        directories[relative_folder] = directory
+        for name, (size, file_mtime_ns) in directory["files"].items():
+            name_match = _DOCUMENT_NAME_REGEX.match(name)
+            document_id = int(name_match.group("id"))
+            document_file = DocumentFile(base_dir / relative_folder / name, size, file_mtime_ns)
+            if name_match.group("kind") == _TEXT_KIND:
+                id_to_text_file_map[document_id] = document_file
+            else:
+                id_to_html_file_map[document_id] = document_file
+        for subfolder_name in directory["subfolders"]:
+            relative_subfolder = os.path.join(relative_folder, subfolder_name)
+            try:
+                subfolder_mtime_ns = os.stat(base_dir / relative_subfolder).st_mtime_ns
+            except FileNotFoundError:
+                # Removed since the previous scan.
+                continue
+            directories_to_scan.append((relative_subfolder, subfolder_mtime_ns))
+    if manifest_path:
+        _write_manifest(manifest_path, base_dir, directories)
+    return ScanResult(id_to_text_file_map, id_to_html_file_map, len(directories), changed_directory_count)
+
+
+def _scanned_directory(folder: Path, mtime_ns: int) -> Dict[str, Any]:
+    files = {}
+    subfolders = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subfolders.append(entry.name)
+            elif _DOCUMENT_NAME_REGEX.match(entry.name) is not None and entry.is_file():
+                entry_stat = entry.stat()
+                files[entry.name] = [entry_stat.st_size, entry_stat.st_mtime_ns]
+    return {"mtime_ns": mtime_ns, "files": files, "subfolders": subfolders}
+
+
+def _directories_from_manifest(manifest_path: Path, base_dir: Path) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(manifest_path, encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as error:
+        # Treat an unreadable or broken manifest like a missing one and rescan everything.
+        _log.warning('Ignoring manifest "%s": %s', manifest_path, error)
+        return {}
+    is_compatible = manifest.get("version") == _MANIFEST_VERSION and manifest.get("base_dir") == str(base_dir.resolve())
+    return manifest["directories"] if is_compatible else {}
+
+
+def _write_manifest(manifest_path: Path, base_dir: Path, directories: Dict[str, Dict[str, Any]]):
+    manifest = {"version": _MANIFEST_VERSION, "base_dir": str(base_dir.resolve()), "directories": directories}
+    temp_manifest_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    try:
+        with open(temp_manifest_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temp_manifest_path, manifest_path)
+    except OSError as error:
+        # The manifest only speeds up later scans, so the current scan can do without it.
+        _log.warning('Cannot write manifest "%s": %s', manifest_path, error)
+        temp_manifest_path.unlink(missing_ok=True)
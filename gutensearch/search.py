@@ -0,0 +1,337 @@
+from functools import reduce
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import OperationalError, connections, models, transaction
+from django.db.models import Case, CharField, F, OuterRef, Q, QuerySet, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Upper
+from django.utils.html import escape
+from django.utils.safestring import SafeString, mark_safe
+from django.utils.translation import gettext_lazy as _
+
+from gutensearch.models import Document, Passage
+
+#: PostgreSQL text search configuration for languages without a specific one, in particular "??".
+DEFAULT_SEARCH_CONFIG = "simple"
+
+#: PostgreSQL text search configurations available for an ISO-639-1 language code.
+LANGUAGE_CODE_TO_SEARCH_CONFIG_MAP = {
+    "ar": "arabic",
+    "da": "danish",
+    "de": "german",
+    "el": "greek",
+    "en": "english",
+    "es": "spanish",
+    "fi": "finnish",
+    "fr": "french",
+    "ga": "irish",
+    "hu": "hungarian",
+    "it": "italian",
+    "nl": "dutch",
+    "no": "norwegian",
+    "pt": "portuguese",
+    "ru": "russian",
+    "sv": "swedish",
+}
+
+
+class Facets(NamedTuple):
+    language_code_counts: List[Tuple[str, int]]
+    author_counts: List[Tuple[str, int]]
+
+
+class SearchMode(models.TextChoices):
+    FULLTEXT = "fulltext", _("Full text")
+    TRIGRAM = "trigram", _("Similar title or author")
+
+
+DEFAULT_SEARCH_MODE = SearchMode.FULLTEXT
+
+MIN_SUGGESTION_PREFIX_LENGTH = 2
+MAX_SUGGESTION_PREFIX_LENGTH = 100
+MAX_SUGGESTION_COUNT = 10
+
+#: Number of authors with the most matching documents to count.
+MAX_AUTHOR_FACET_COUNT = 10
+
+#: Number of titles and authors to read for suggestions, which includes duplicates, for example
+#: from different editions of a book.
+_SUGGESTION_CANDIDATE_COUNT = 50
+
+_SEARCH_CONFIGS = sorted({DEFAULT_SEARCH_CONFIG, *LANGUAGE_CODE_TO_SEARCH_CONFIG_MAP.values()})
+
+# Control characters that do not occur in documents so ts_headline() can mark matches in the
+# unescaped text, which then is escaped before the markers are replaced by HTML.
+_SNIPPET_START_MARKER = "\x02"
+_SNIPPET_STOP_MARKER = "\x03"
+_SNIPPET_MAX_FRAGMENTS = 3
+_SNIPPET_MAX_WORDS = 20
+_SNIPPET_MIN_WORDS = 10
+
+
+def search_config_for(language_code: str) -> str:
+    return LANGUAGE_CODE_TO_SEARCH_CONFIG_MAP.get(language_code, DEFAULT_SEARCH_CONFIG)
+
+
+def search_config_expression() -> Case:
+    """
+    SQL expression resolving the search configuration from the ``language_code`` of each row.
+    """
+    return Case(
+        *[
+            When(language_code=language_code, then=Value(search_config))
+            for language_code, search_config in LANGUAGE_CODE_TO_SEARCH_CONFIG_MAP.items()
+        ],
+        default=Value(DEFAULT_SEARCH_CONFIG),
+        output_field=CharField(),
+    )
+
+
+def document_search_vector() -> SearchVector:
+    search_config = search_config_expression()
+    return SearchVector("title", config=search_config, weight="A") + SearchVector(
+        "authors", config=search_config, weight="B"
+    )
+
+
+def passage_search_vector() -> SearchVector:
+    return SearchVector("text", config=search_config_expression(), weight="C")
+
+
+def update_search_vectors(document_ids: Iterable[int]):
+    document_ids = list(document_ids)
+    Document.objects.filter(id__in=document_ids).update(search_vector=document_search_vector())
+    Passage.objects.filter(document_id__in=document_ids).update(search_vector=passage_search_vector())
+
+
+def search_query(search_term: str, language_code: Optional[str] = None) -> SearchQuery:
+    """
+    Query for ``search_term`` using the search configuration of ``language_code``. Without a
+    language, the query matches documents in any language by combining the queries for all
+    search configurations.
+    """
+    if language_code:
+        return SearchQuery(search_term, config=search_config_for(language_code), search_type="websearch")
+    return reduce(
+        lambda result, search_config: result | SearchQuery(search_term, config=search_config, search_type="websearch"),
+        _SEARCH_CONFIGS[1:],
+        SearchQuery(search_term, config=_SEARCH_CONFIGS[0], search_type="websearch"),
+    )
+
+
+def default_search_mode() -> SearchMode:
+    return SearchMode(getattr(settings, "GUTENSEARCH_SEARCH_MODE", DEFAULT_SEARCH_MODE))
+
+
+def documents_matching(
+    search_term: str, language_code: Optional[str] = None, search_mode: Optional[SearchMode] = None
+) -> QuerySet[Document]:
+    """
+    Documents matching ``search_term`` annotated with a ``rank`` and ordered by it with the best
+    matches first, and by ``id`` for documents with the same rank.
+    """
+    if search_mode is None:
+        search_mode = default_search_mode()
+    if search_mode == SearchMode.TRIGRAM:
+        result = _documents_with_similar_title_or_authors(search_term)
+    else:
+        assert search_mode == SearchMode.FULLTEXT, f"search_mode={search_mode!r}"
+        result = _documents_with_matching_title_authors_or_passages(search_term, language_code)
+    if language_code:
+        result = result.filter(language_code=language_code)
+    return result
+
+
+def _documents_with_matching_title_authors_or_passages(
+    search_term: str, language_code: Optional[str] = None
+) -> QuerySet[Document]:
+    """
+    Documents where the title, authors or any passage of the text matches ``search_term``. The matching
+    passages are grouped by their document using ``UNION``, which also removes duplicates.
+    """
+    query = search_query(search_term, language_code)
+    matching_passages = Passage.objects.filter(search_vector=query)
+    if language_code:
+        matching_passages = matching_passages.filter(language_code=language_code)
+    matching_document_ids = (
+        Document.objects.filter(search_vector=query).values("id").union(matching_passages.values("document_id"))
+    )
+    best_passage_rank = Subquery(
+        Passage.objects.filter(document_id=OuterRef("id"), search_vector=query)
+        .annotate(rank=SearchRank(F("search_vector"), query, cover_density=True))
+        .order_by("-rank")
+        .values("rank")[:1]
+    )
+    return (
+        Document.objects.filter(id__in=matching_document_ids)
+        .annotate(
+            rank=_keyset_rank(
+                Greatest(
+                    Coalesce(SearchRank(F("search_vector"), query, cover_density=True), 0.0),
+                    Coalesce(best_passage_rank, 0.0),
+                )
+            )
+        )
+        .order_by("-rank", "id")
+    )
+
+
+def snippets_for(document_ids: Iterable[int], search_term: str, language_code: Optional[str] = None) -> Dict[int, str]:
+    """
+    HTML snippet of the best matching passage for each document in ``document_ids`` with matches
+    highlighted using ``<mark>``. Because ``ts_headline()`` has to parse the whole text it is applied
+    to, callers should pass only the documents they actually show, for example the first page of
+    :py:func:`documents_matching`. Documents without a matching passage have no snippet.
+    """
+    return {
+        document_id: _snippet_html(headline)
+        for document_id, headline in _snippet_headlines(document_ids, search_term, language_code)
+    }
+
+
+async def asnippets_for(
+    document_ids: Iterable[int], search_term: str, language_code: Optional[str] = None
+) -> Dict[int, str]:
+    """
+    Same as :py:func:`snippets_for` but querying asynchronously.
+    """
+    return {
+        document_id: _snippet_html(headline)
+        async for document_id, headline in _snippet_headlines(document_ids, search_term, language_code)
+    }
+
+
+def _snippet_headlines(document_ids: Iterable[int], search_term: str, language_code: Optional[str]) -> QuerySet:
+    query = search_query(search_term, language_code)
+    # Find the best passage of each document first so ts_headline() only runs on these.
+    best_passage_ids = (
+        Passage.objects.filter(document_id__in=list(document_ids), search_vector=query)
+        .annotate(rank=SearchRank(F("search_vector"), query, cover_density=True))
+        .order_by("document_id", "-rank", "ordinal")
+        .distinct("document_id")
+        .values("id")
+    )
+    passages = Passage.objects.filter(id__in=best_passage_ids).annotate(
+        headline=SearchHeadline(
+            "text",
+            query,
+            config=search_config_expression(),
+            start_sel=_SNIPPET_START_MARKER,
+            stop_sel=_SNIPPET_STOP_MARKER,
+            max_fragments=_SNIPPET_MAX_FRAGMENTS,
+            max_words=_SNIPPET_MAX_WORDS,
+            min_words=_SNIPPET_MIN_WORDS,
+            fragment_delimiter=" … ",
+        )
+    )
+    return passages.values_list("document_id", "headline")
+
+
+def _snippet_html(headline: str) -> SafeString:
+    return mark_safe(escape(headline).replace(_SNIPPET_START_MARKER, "<mark>").replace(_SNIPPET_STOP_MARKER, "</mark>"))
+
+
+def _documents_with_similar_title_or_authors(search_term: str) -> QuerySet[Document]:
+    """
+    Documents where ``search_term`` is a substring of or similar to the title or authors. Both the
+    ``icontains`` and the ``%`` operator refer to ``UPPER(...)`` so they can use the trigram indexes.
+    """
+    upper_search_term = search_term.upper()
+    return (
+        Document.objects.alias(title_upper=Upper("title"), authors_upper=Upper("authors"))
+        .filter(
+            Q(title__icontains=search_term)
+            | Q(authors__icontains=search_term)
+            | Q(title_upper__trigram_similar=upper_search_term)
+            | Q(authors_upper__trigram_similar=upper_search_term)
+        )
+        .annotate(
+            rank=_keyset_rank(
+                Greatest(
+                    TrigramSimilarity("title_upper", upper_search_term),
+                    TrigramSimilarity("authors_upper", upper_search_term),
+                )
+            )
+        )
+        .order_by("-rank", "id")
+    )
+
+
+def _keyset_rank(rank: models.Expression) -> Cast:
+    """
+    ``rank`` as ``double precision`` instead of the ``real`` computed by ``ts_rank_cd()`` and
+    ``similarity()``. Keyset pagination stores the rank of the last row in a page token as Python float
+    and compares it to the ranks of the other rows; for ``real`` this comparison widens the ranks and
+    consequently is inexact, so rows with the same rank would be repeated or skipped.
+    """
+    return Cast(rank, models.FloatField())
+
+
+async def asuggestions_for(prefix: str, max_count: int = MAX_SUGGESTION_COUNT) -> List[str]:
+    """
+    Distinct titles and authors starting with ``prefix`` ignoring case, sorted alphabetically. The
+    queries use the prefix indexes on ``UPPER(title)`` and ``UPPER(authors)`` and never read the text.
+    The candidates are ordered before limiting them so that the suggestions are the alphabetically
+    first ones rather than whichever rows the database happens to find first.
+    The prefix is converted to upper case by the database, too, because for example Python converts "ß"
+    to "SS" while PostgreSQL keeps it.
+    """
+    upper_prefix = Upper(Value(prefix))
+    suggestions = set()
+    for field_name in ("title", "authors"):
+        candidates = (
+            Document.objects.alias(field_upper=Upper(field_name))
+            .filter(field_upper__startswith=upper_prefix)
+            .order_by(field_name)
+            .values_list(field_name, flat=True)[:_SUGGESTION_CANDIDATE_COUNT]
+        )
+        suggestions.update([candidate async for candidate in candidates])
+    return sorted(suggestions, key=str.casefold)[:max_count]
+
+
+def facets_for(
+    documents: QuerySet[Document], max_author_count: int = MAX_AUTHOR_FACET_COUNT, timeout_in_ms: int = 0
+) -> Optional[Facets]:
+    """
+    The number of ``documents`` for each language and for the ``max_author_count`` authors with the
+    most documents, both sorted by descending count. All counts are computed in a single query grouping
+    the documents by ``GROUPING SETS``. With ``timeout_in_ms``, the query is cancelled if it takes longer,
+    in which case the result is ``None``.
+    """
+    connection = connections[documents.db]
+    quote_name = connection.ops.quote_name
+    document_ids_sql, document_ids_params = documents.order_by().values("id").query.sql_with_params()
+    facet_sql = f"""
+        select is_author, facet_value, document_count
+        from (
+            select
+                grouping({quote_name("authors")}) = 0 as is_author,
+                case
+                    when grouping({quote_name("authors")}) = 0 then {quote_name("authors")}
+                    else {quote_name("language_code")}
+                end as facet_value,
+                count(*) as document_count,
+                row_number() over (
+                    partition by grouping({quote_name("authors")}) order by count(*) desc
+                ) as facet_position
+            from {quote_name(Document._meta.db_table)}
+            where {quote_name("id")} in ({document_ids_sql})
+            group by grouping sets (({quote_name("language_code")}), ({quote_name("authors")}))
+        ) as facets
+        where not is_author or facet_position <= %s
+        order by is_author, facet_position
+    """
+    language_code_counts = []
+    author_counts = []
+    try:
+        with transaction.atomic(using=documents.db), connection.cursor() as cursor:
+            if timeout_in_ms >= 1:
+                cursor.execute("select set_config('statement_timeout', %s, true)", [f"{timeout_in_ms}ms"])
+            cursor.execute(facet_sql, [*document_ids_params, max_author_count])
+            for is_author, facet_value, document_count in cursor.fetchall():
+                (author_counts if is_author else language_code_counts).append((facet_value, document_count))
+    except OperationalError:
+        # Most likely the query exceeded the statement timeout.
+        return None
+    return Facets(language_code_counts, author_counts)
@@ -0,0 +1,174 @@
+from typing import Dict, List, Type
+
+from django.apps.registry import Apps
+from django.db import connection, models, transaction
+
+_SHADOW_SUFFIX = "_shadow"
+_SHADOW_INDEX_PREFIX = "shadow_"
+
+
+class ShadowTables:
+    """
+    Tables with the same columns as the tables of ``models_to_shadow`` into which rows can be loaded while
+    readers still use the original tables. The shadow tables are created without any indexes and
+    constraints except their primary keys. After loading, :py:meth:`build_indexes` adds the indexes of the
+    models as well as the indexes and constraints of their foreign keys, and :py:meth:`swap` atomically
+    replaces the original tables with the shadow tables.
+
+    Models referring to other models with a foreign key must come after the models they refer to. In the
+    shadow tables, such foreign keys refer to the respective shadow table.
+    """
+
+    def __init__(self, models_to_shadow: List[Type[models.Model]]):
+        self._models = models_to_shadow
+        self._model_to_shadow_model_map: Dict[Type[models.Model], Type[models.Model]] = {}
+        apps = Apps()
+        for model in models_to_shadow:
+            self._model_to_shadow_model_map[model] = _shadow_model(model, apps, self._model_to_shadow_model_map)
+
+    def shadow_model(self, model: Type[models.Model]) -> Type[models.Model]:
+        return self._model_to_shadow_model_map[model]
+
+    def create(self):
+        self.drop()
+        with connection.schema_editor() as schema_editor:
+            for model in self._models:
+                schema_editor.create_model(self.shadow_model(model))
+
+    def drop(self):
+        with connection.cursor() as cursor:
+            for model in reversed(self._models):
+                cursor.execute(
+                    f"drop table if exists {connection.ops.quote_name(self.shadow_model(model)._meta.db_table)}"
+                )
+
+    def build_indexes(self):
+        quote_name = connection.ops.quote_name
+        with connection.schema_editor() as schema_editor:
+            for model in self._models:
+                shadow_model = self.shadow_model(model)
+                shadow_table = shadow_model._meta.db_table
+                for index in model._meta.indexes:
+                    shadow_index = index.clone()
+                    shadow_index.name = _SHADOW_INDEX_PREFIX + index.name
+                    schema_editor.add_index(shadow_model, shadow_index)
+                for field in _foreign_key_fields(model):
+                    if _is_foreign_key_indexed(field):
+                        schema_editor.add_index(
+                            shadow_model,
+                            models.Index(fields=[field.name], name=_foreign_key_index_name(shadow_table, field)),
+                        )
+                    if field.db_constraint:
+                        target_field = shadow_model._meta.get_field(field.name).target_field
+                        target_table = target_field.model._meta.db_table
+                        # Like Django, check the foreign keys only at the end of each transaction.
+                        schema_editor.execute(
+                            f"alter table {quote_name(shadow_table)} "
+                            f"add constraint {quote_name(_foreign_key_constraint_name(shadow_table, field))} "
+                            f"foreign key ({quote_name(field.column)}) "
+                            f"references {quote_name(target_table)} ({quote_name(target_field.column)}) "
+                            f"deferrable initially deferred"
+                        )
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            for model in self._models:
+                cursor.execute(f"analyze {connection.ops.quote_name(self.shadow_model(model)._meta.db_table)}")
+
+    def swap(self):
+        """
+        Replace the original tables by the shadow tables, which in turn get the names of the original tables
+        and their primary keys, sequences, foreign keys and indexes. Readers either see the complete old or
+        the complete new rows.
+        """
+        quote_name = connection.ops.quote_name
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model in self._models:
+                cursor.execute(f"lock table {quote_name(model._meta.db_table)} in access exclusive mode")
+            for model in reversed(self._models):
+                cursor.execute(f"drop table {quote_name(model._meta.db_table)}")
+            for model in self._models:
+                for sql in _renaming_sqls(cursor, self.shadow_model(model), model):
+                    cursor.execute(sql)
+
+
+def _foreign_key_fields(model: Type[models.Model]) -> List[models.Field]:
+    return [field for field in model._meta.local_fields if field.remote_field is not None]
+
+
+def _is_foreign_key_indexed(field: models.Field) -> bool:
+    # Unique foreign keys, for example of one to one fields, already have the index of their constraint.
+    return field.db_index and not field.unique
+
+
+def _foreign_key_index_name(db_table: str, field: models.Field) -> str:
+    return f"{db_table}_{field.column}_idx"
+
+
+def _foreign_key_constraint_name(db_table: str, field: models.Field) -> str:
+    return f"{db_table}_{field.column}_fk"
+
+
+def _renaming_sqls(cursor, shadow_model: Type[models.Model], model: Type[models.Model]) -> List[str]:
+    quote_name = connection.ops.quote_name
+    shadow_table = shadow_model._meta.db_table
+    db_table = model._meta.db_table
+    primary_key_column = model._meta.pk.column
+    cursor.execute("select pg_get_serial_sequence(%s, %s)", [shadow_table, primary_key_column])
+    (shadow_sequence,) = cursor.fetchone()
+    result = [
+        f"alter table {quote_name(shadow_table)} rename to {quote_name(db_table)}",
+        f"alter table {quote_name(db_table)} rename constraint "
+        f"{quote_name(shadow_table + '_pkey')} to {quote_name(db_table + '_pkey')}",
+    ]
+    if shadow_sequence is not None:
+        result.append(
+            f"alter sequence {shadow_sequence} rename to {quote_name(f'{db_table}_{primary_key_column}_seq')}"
+        )
+    for index in model._meta.indexes:
+        result.append(f"alter index {quote_name(_SHADOW_INDEX_PREFIX + index.name)} rename to {quote_name(index.name)}")
+    for field in _foreign_key_fields(model):
+        if _is_foreign_key_indexed(field):
+            result.append(
+                f"alter index {quote_name(_foreign_key_index_name(shadow_table, field))} "
+                f"rename to {quote_name(_foreign_key_index_name(db_table, field))}"
+            )
+        if field.db_constraint:
+            result.append(
+                f"alter table {quote_name(db_table)} rename constraint "
+                f"{quote_name(_foreign_key_constraint_name(shadow_table, field))} "
+                f"to {quote_name(_foreign_key_constraint_name(db_table, field))}"
+            )
+    return result
+
+
+def _shadow_model(
+    model: Type[models.Model], apps: Apps, model_to_shadow_model_map: Dict[Type[models.Model], Type[models.Model]]
+) -> Type[models.Model]:
+    """
+    Model with the same fields as ``model`` but stored in a shadow table and without any indexes and
+    constraints except the primary key. It is registered in a separate app registry so it does not show
+    up in migrations.
+    """
+    meta = type(
+        "Meta",
+        (),
+        {
+            "app_label": model._meta.app_label,
+            "apps": apps,
+            "db_table": model._meta.db_table + _SHADOW_SUFFIX,
+        },
+    )
+    attributes = {"__module__": model.__module__, "Meta": meta}
+    for field in model._meta.local_fields:
+        if field.remote_field is not None:
+            _, _, args, kwargs = field.deconstruct()
+            kwargs["to"] = model_to_shadow_model_map[field.related_model]
+            kwargs["related_name"] = "+"
+            # ShadowTables.build_indexes() adds the index and constraint once the rows are loaded.
+            kwargs["db_constraint"] = False
+            kwargs["db_index"] = False
+            attributes[field.name] = type(field)(*args, **kwargs)
+        else:
+            attributes[field.name] = field.clone()
+    return type(f"Shadow{model.__name__}", (models.Model,), attributes)
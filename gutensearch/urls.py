@@ -1,9 +1,19 @@
 from django.urls import path
 
-from gutensearch.views import document_view, search_query_view, search_result_view
+from gutensearch.views import (
+    document_view,
+    metrics_view,
+    search_query_view,
+    search_result_view,
+    slow_searches_view,
+    suggest_view,
+)
 
 urlpatterns = [
     path("document/<int:pk>/", document_view, name="document"),
+    path("metrics/", metrics_view, name="metrics"),
+    path("metrics/slow-searches/", slow_searches_view, name="slow_searches"),
     path("search/", search_result_view, name="search_result"),
+    path("suggest/", suggest_view, name="suggest"),
     path("", search_query_view, name="search_query"),
 ]
@@ -1,23 +1,72 @@
-from typing import Any, Dict, Optional
+import zlib
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.core.exceptions import BadRequest
-from django.db.models import Q, QuerySet
+from django.http import Http404
 from django.http.request import HttpRequest
-from django.http.response import HttpResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.http.response import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
 from django.urls import reverse
-from django.utils.http import urlencode
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, quote_etag, urlencode
 
 from gutensearch.forms import SearchForm
-from gutensearch.models import Document
+from gutensearch.instrumentation import metrics_registry
+from gutensearch.models import Document, DocumentHtml
+from gutensearch.pagination import aapproximate_count, akeyset_page
+from gutensearch.result_cache import SearchResultPage, acached_facets, acached_search_result_page, acached_suggestions
+from gutensearch.routers import read_from_replica
+from gutensearch.search import (
+    LANGUAGE_CODE_TO_SEARCH_CONFIG_MAP,
+    MAX_SUGGESTION_PREFIX_LENGTH,
+    MIN_SUGGESTION_PREFIX_LENGTH,
+    Facets,
+    SearchMode,
+    asnippets_for,
+    asuggestions_for,
+    default_search_mode,
+    documents_matching,
+    facets_for,
+)
 
+#: Number of documents to show on each search result page.
+_PAGE_SIZE = 20
 
-def search_query_view(request: HttpRequest) -> HttpResponse:
+#: Number of matching documents up to which the result count is exact instead of estimated.
+_MAX_EXACT_RESULT_COUNT = 1000
+
+#: Default time in milliseconds computing the facets may take before the result page is shown without them.
+_DEFAULT_FACET_TIMEOUT_IN_MS = 200
+
+#: Number of compressed bytes to decompress at once while streaming the HTML of a document.
+_DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+#: Content codings the HTML of a document can be sent with. For the same quality, the earlier one wins
+#: because gzip is more widely supported, for example some clients expect raw deflate without the zlib
+#: header.
+_CONTENT_ENCODINGS = ("gzip", "deflate")
+
+_HTML_CONTENT_TYPE = "text/html; charset=utf-8"
+_PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_DEFAULT_METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
+
+async def search_query_view(request: HttpRequest) -> HttpResponse:
     if request.method == "POST":
         form = SearchForm(request.POST)
         if form.is_valid():
             search_term = form.cleaned_data.get("search_term")
             parameters = {"search_term": search_term}
+            language_code = form.cleaned_data.get("language_code")
+            if language_code:
+                parameters["language_code"] = language_code
+            search_mode = form.cleaned_data.get("search_mode")
+            if search_mode:
+                parameters["search_mode"] = search_mode
             return redirect(reverse_with_parameters("search_result", parameters))
     else:
         form = SearchForm()
@@ -30,30 +79,280 @@ def search_query_view(request: HttpRequest) -> HttpResponse:
     )
 
 
-def search_result_view(request: HttpRequest) -> HttpResponse:
+@read_from_replica
+async def search_result_view(request: HttpRequest) -> HttpResponse:
     form = SearchForm(request.GET)
     if not form.is_valid():
         raise BadRequest(f"form must be valid: {form.errors}")
     search_term = form.cleaned_data["search_term"]
-    documents = documents_matching(search_term)[:20]
+    language_code = form.cleaned_data["language_code"]
+    search_mode = form.cleaned_data["search_mode"] or default_search_mode()
+    after_token = request.GET.get("after")
+    before_token = request.GET.get("before")
+    try:
+        page = await acached_search_result_page(
+            search_term,
+            {"language_code": language_code, "search_mode": search_mode, "after": after_token, "before": before_token},
+            lambda: _computed_search_result_page(search_term, language_code, search_mode, after_token, before_token),
+        )
+    except ValueError as error:
+        raise BadRequest(str(error))
+    facets = await acached_facets(
+        search_term,
+        {"language_code": language_code, "search_mode": search_mode},
+        lambda: _computed_facets(search_term, language_code, search_mode),
+    )
+    # Only fetch the fields actually shown instead of the bulky text and HTML.
+    id_to_document_map = await Document.objects.only("id", "title", "authors").ain_bulk(page.document_ids)
+    documents = [
+        id_to_document_map[document_id] for document_id in page.document_ids if document_id in id_to_document_map
+    ]
     return render(
         request,
         "gutensearch/search_result.html",
         {
-            "documents": documents,
+            "author_counts": facets.author_counts if facets is not None else [],
+            "language_code_counts": [
+                (facet_language_code, document_count, _language_facet_url(request, facet_language_code))
+                for facet_language_code, document_count in (facets.language_code_counts if facets is not None else [])
+            ],
+            "documents_and_snippets": [(document, page.id_to_snippet_map.get(document.id)) for document in documents],
+            "next_url": _search_result_page_url(request, "after", page.next_token),
+            "previous_url": _search_result_page_url(request, "before", page.previous_token),
+            "result_count": page.result_count,
             "search_term": search_term,
         },
     )
 
 
-def documents_matching(search_term: str) -> QuerySet[Document]:
-    return Document.objects.filter(Q(title__icontains=search_term) | Q(text__icontains=search_term)).order_by("id")
+async def _computed_search_result_page(
+    search_term: str,
+    language_code: Optional[str],
+    search_mode: SearchMode,
+    after_token: Optional[str],
+    before_token: Optional[str],
+) -> SearchResultPage:
+    matching_documents = documents_matching(search_term, language_code, search_mode)
+    page = await akeyset_page(
+        matching_documents.only("id"), "rank", _PAGE_SIZE, after_token=after_token, before_token=before_token
+    )
+    document_ids = [document.id for document in page.items]
+    if search_mode == SearchMode.FULLTEXT:
+        id_to_snippet_map = await asnippets_for(document_ids, search_term, language_code)
+    else:
+        id_to_snippet_map = {}
+    result_count = (
+        await aapproximate_count(matching_documents, _MAX_EXACT_RESULT_COUNT)
+        if getattr(settings, "GUTENSEARCH_SHOW_RESULT_COUNT", True)
+        else None
+    )
+    return SearchResultPage(document_ids, id_to_snippet_map, page.next_token, page.previous_token, result_count)
+
+
+@read_from_replica
+async def suggest_view(request: HttpRequest) -> JsonResponse:
+    """
+    Titles and authors starting with the ``prefix`` parameter as JSON for type-ahead suggestions.
+    """
+    prefix = request.GET.get("prefix", "").strip()[:MAX_SUGGESTION_PREFIX_LENGTH]
+    if len(prefix) < MIN_SUGGESTION_PREFIX_LENGTH:
+        suggestions = []
+    elif getattr(settings, "GUTENSEARCH_CACHE_SUGGESTIONS", True):
+        suggestions = await acached_suggestions(prefix, lambda: asuggestions_for(prefix))
+    else:
+        suggestions = await asuggestions_for(prefix)
+    return JsonResponse({"prefix": prefix, "suggestions": suggestions})
+
+
+async def _computed_facets(search_term: str, language_code: Optional[str], search_mode: SearchMode) -> Optional[Facets]:
+    matching_documents = documents_matching(search_term, language_code, search_mode)
+    timeout_in_ms = getattr(settings, "GUTENSEARCH_FACET_TIMEOUT_IN_MS", _DEFAULT_FACET_TIMEOUT_IN_MS)
+    # Django has no asynchronous cursors, so the raw query runs in a thread.
+    return await sync_to_async(facets_for)(matching_documents, timeout_in_ms=timeout_in_ms)
+
+
+def _language_facet_url(request: HttpRequest, language_code: str) -> Optional[str]:
+    # The search form only accepts languages with a search configuration.
+    if language_code not in LANGUAGE_CODE_TO_SEARCH_CONFIG_MAP:
+        return None
+    return _search_result_page_url(request, "language_code", language_code)
+
+
+def _search_result_page_url(request: HttpRequest, name: str, value: Optional[str]) -> Optional[str]:
+    """
+    URL of the first search result page with the same parameters as ``request`` except for ``name``
+    being ``value``, or ``None`` if there is no ``value``. Passing a page token as ``name`` turns this
+    into the URL of the respective page.
+    """
+    if value is None:
+        return None
+    parameters = {
+        parameter_name: parameter_value
+        for parameter_name, parameter_value in request.GET.items()
+        if parameter_name not in ("after", "before")
+    }
+    parameters[name] = value
+    return reverse_with_parameters("search_result", parameters)
 
 
 def reverse_with_parameters(view_name: str, parameters: Dict[str, Optional[Any]]) -> str:
     return f"{reverse(view_name)}?{urlencode(parameters)}"
 
 
-def document_view(request: HttpRequest, pk: Optional[int] = None) -> HttpResponse:
-    document = get_object_or_404(Document, pk=pk)
-    return render(request, "gutensearch/document.html", {"html": document.html})
+@read_from_replica
+async def document_view(request: HttpRequest, pk: Optional[int] = None) -> HttpResponse:
+    """
+    The HTML of the document, which is streamed without passing it through the template engine.
+
+    The ETag is derived from the content hash or, if the documents were imported without ``--hash``,
+    from the size and modification time of the HTML file, which also is the Last-Modified time. This
+    way, requests for an unchanged document get a 304 after reading only the document row.
+
+    As the HTML is stored compressed with zlib, clients preferring the "deflate" encoding get it as is.
+    Otherwise, it is decompressed in chunks, and compressed again with gzip if the client accepts it.
+    """
+    source_fields = await _document_source_fields(pk)
+    if source_fields is None:
+        raise Http404(f"document must exist: {pk}")
+    content_hash, html_size, html_mtime_ns = source_fields
+    # Compressed and uncompressed representations differ, so the ETag includes the encoding.
+    encoding_to_quality_map = _encoding_to_quality_map(request.headers.get("Accept-Encoding", ""))
+    content_encoding = _preferred_encoding(encoding_to_quality_map)
+    etag_parts = [pk, content_hash] if content_hash else [pk, html_size, html_mtime_ns]
+    if content_encoding is not None:
+        etag_parts.append(content_encoding)
+    etag = quote_etag("-".join(str(etag_part) for etag_part in etag_parts))
+    last_modified = html_mtime_ns // 1_000_000_000 if html_mtime_ns else None
+    result = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if result is None:
+        try:
+            document_html = await DocumentHtml.objects.aget(pk=pk)
+        except DocumentHtml.DoesNotExist:
+            raise Http404(f"HTML of document must exist: {pk}")
+        if content_encoding == "deflate":
+            result = HttpResponse(document_html.compressed_html, content_type=_HTML_CONTENT_TYPE)
+        else:
+            chunks = _decompressed_chunks(document_html.compressed_html)
+            if content_encoding == "gzip":
+                chunks = _gzipped_chunks(chunks)
+            result = StreamingHttpResponse(chunks, content_type=_HTML_CONTENT_TYPE)
+        if content_encoding is not None:
+            result["Content-Encoding"] = content_encoding
+    result["ETag"] = etag
+    if last_modified is not None:
+        result["Last-Modified"] = http_date(last_modified)
+    patch_vary_headers(result, ("Accept-Encoding",))
+    return result
+
+
+def _encoding_to_quality_map(accept_encoding: str) -> Dict[str, float]:
+    """
+    The quality values of the content codings in an ``Accept-Encoding`` header, for example
+    ``{"gzip": 1.0, "deflate": 0.0}`` for "gzip, deflate;q=0".
+    """
+    result = {}
+    for encoding_and_parameters in accept_encoding.split(","):
+        encoding, *parameters = (part.strip() for part in encoding_and_parameters.split(";"))
+        if not encoding:
+            continue
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    # A client sending a broken quality value likely does not handle the encoding either.
+                    quality = 0.0
+        result[encoding.lower()] = quality
+    return result
+
+
+def _accepts_encoding(encoding_to_quality_map: Dict[str, float], encoding: str) -> bool:
+    """
+    Whether ``encoding`` is acceptable, either explicitly or by "*", which excludes it with "q=0".
+    """
+    return _encoding_quality(encoding_to_quality_map, encoding) > 0
+
+
+def _encoding_quality(encoding_to_quality_map: Dict[str, float], encoding: str) -> float:
+    return encoding_to_quality_map.get(encoding, encoding_to_quality_map.get("*", 0.0))
+
+
+def _preferred_encoding(encoding_to_quality_map: Dict[str, float]) -> Optional[str]:
+    """
+    The acceptable content coding from :py:data:`_CONTENT_ENCODINGS` with the highest quality, or
+    ``None`` if the HTML has to be sent uncompressed.
+    """
+    acceptable_encodings = [
+        encoding for encoding in _CONTENT_ENCODINGS if _accepts_encoding(encoding_to_quality_map, encoding)
+    ]
+    # Of several encodings with the highest quality, max() returns the first one.
+    return max(
+        acceptable_encodings,
+        key=lambda encoding: _encoding_quality(encoding_to_quality_map, encoding),
+        default=None,
+    )
+
+
+async def _document_source_fields(pk: Optional[int]) -> Optional[Tuple[str, int, int]]:
+    """
+    The content hash, size and modification time of the HTML file the document was imported from,
+    or ``None`` if there is no such document.
+    """
+    return await Document.objects.filter(pk=pk).values_list("content_hash", "html_size", "html_mtime_ns").afirst()
+
+
+async def _decompressed_chunks(compressed_data: bytes) -> AsyncIterator[bytes]:
+    decompressor = zlib.decompressobj()
+    compressed_view = memoryview(compressed_data)
+    for start in range(0, len(compressed_view), _DECOMPRESS_CHUNK_SIZE):
+        chunk = decompressor.decompress(compressed_view[start : start + _DECOMPRESS_CHUNK_SIZE])
+        if chunk:
+            yield chunk
+    chunk = decompressor.flush()
+    if chunk:
+        yield chunk
+
+
+async def _gzipped_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed_chunk = compressor.compress(chunk)
+        if compressed_chunk:
+            yield compressed_chunk
+    yield compressor.flush()
+
+
+async def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Metrics of the search result and document views of this process for Prometheus.
+    """
+    _check_metrics_client(request)
+    return HttpResponse(metrics_registry.prometheus_text(), content_type=_PROMETHEUS_CONTENT_TYPE)
+
+
+async def slow_searches_view(request: HttpRequest) -> JsonResponse:
+    """
+    The most recent slow searches of this process with the plan of their slowest query as JSON.
+    """
+    _check_metrics_client(request)
+    return JsonResponse({"slow_searches": [slow_search._asdict() for slow_search in metrics_registry.slow_searches()]})
+
+
+def _check_metrics_client(request: HttpRequest):
+    """
+    Check that the metrics are enabled by ``GUTENSEARCH_METRICS_TOKEN`` and the request sends this token
+    as bearer token from one of the ``GUTENSEARCH_METRICS_ALLOWED_IPS``. Behind a reverse proxy, all
+    requests come from its address, so the address alone does not protect the metrics.
+    """
+    # Pretend the metrics do not exist for other clients instead of revealing search terms and plans.
+    metrics_token = getattr(settings, "GUTENSEARCH_METRICS_TOKEN", None)
+    if not metrics_token:
+        raise Http404()
+    allowed_ips = getattr(settings, "GUTENSEARCH_METRICS_ALLOWED_IPS", _DEFAULT_METRICS_ALLOWED_IPS)
+    if request.META.get("REMOTE_ADDR") not in allowed_ips:
+        raise Http404()
+    authorization = request.headers.get("Authorization", "")
+    if not constant_time_compare(authorization, f"Bearer {metrics_token}"):
+        raise Http404()
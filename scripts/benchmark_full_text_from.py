@@ -0,0 +1,106 @@
+"""
+Micro-benchmark for reading document files with ``DocumentParser._full_text_from()``.
+
+It compares the current implementation with the previous one, which normalized newlines on the raw
+bytes and decoded the whole file up to two times. To run it, use:
+
+    python -m scripts.benchmark_full_text_from
+"""
+import argparse
+import tempfile
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+from gutensearch.gutenberg import (
+    _BROKEN_ENCODING_TO_ENCODING_MAP,
+    _CP_HYPHEN_REGEX,
+    _ENCODING_MARKER,
+    _END_EBOOK_MARKER_REGEX,
+    _START_EBOOK_MARKER_REGEX,
+    DEFAULT_ENCODING,
+    DocumentParser,
+    _text_after_colon,
+)
+
+_DEFAULT_REPEAT = 20
+_DEFAULT_SIZES_IN_KB = "16,128,512,4096"
+
+_INTRO = (
+    "The Project Gutenberg EBook of Benchmarks\r\n\r\n"
+    "Title: Benchmarks\r\n"
+    "Author: Some Writer\r\n"
+    "Language: German\r\n"
+    "Character set encoding: UTF-8\r\n\r\n"
+    "*** START OF THIS PROJECT GUTENBERG EBOOK BENCHMARKS ***\r\n"
+)
+_LINE = "Über die Länge einer typischen Zeile in einem Buch von Project Gutenberg.\r\n"
+_OUTRO = "*** END OF THIS PROJECT GUTENBERG EBOOK BENCHMARKS ***\r\n"
+
+
+def legacy_full_text_from(path: Path) -> str:
+    with open(path, "rb") as text_file:
+        content = text_file.read().replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    actual_encoding = None
+    result = content.decode(DEFAULT_ENCODING, errors="replace")
+    for line in result.split("\n"):
+        if _START_EBOOK_MARKER_REGEX.match(line) is not None or _END_EBOOK_MARKER_REGEX.match(line) is not None:
+            break
+        if line.startswith(_ENCODING_MARKER):
+            actual_encoding = _text_after_colon(line).lower()
+            actual_encoding = _CP_HYPHEN_REGEX.sub("cp", actual_encoding)
+            actual_encoding = _BROKEN_ENCODING_TO_ENCODING_MAP.get(actual_encoding, actual_encoding)
+            break
+    if actual_encoding is not None and actual_encoding != DEFAULT_ENCODING:
+        result = content.decode(actual_encoding, errors="replace")
+    return result.strip(" \n\t")
+
+
+def _write_document(path: Path, size_in_kb: int):
+    line_count = size_in_kb * 1024 // len(_LINE.encode("utf-8"))
+    path.write_bytes((_INTRO + _LINE * line_count + _OUTRO).encode("utf-8"))
+
+
+def _seconds_and_peak_memory(read: Callable[[Path], str], path: Path, repeat: int):
+    seconds = min(timeit.repeat(lambda: read(path), number=1, repeat=repeat))
+    tracemalloc.start()
+    read(path)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak_memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument(
+        "--repeat", "-r", default=_DEFAULT_REPEAT, type=int, help="number of runs per file; default: %(default)d"
+    )
+    parser.add_argument(
+        "--sizes",
+        "-s",
+        default=_DEFAULT_SIZES_IN_KB,
+        metavar="LIST",
+        help="comma separated list of file sizes in KB; default: %(default)s",
+    )
+    arguments = parser.parse_args()
+    document_parser = DocumentParser(0)
+    print(f"{'size':>8} {'legacy ms':>10} {'current ms':>10} {'speedup':>8} {'legacy MB':>10} {'current MB':>10}")
+    with tempfile.TemporaryDirectory() as temp_folder:
+        for size_in_kb in [int(size) for size in arguments.sizes.split(",")]:
+            path = Path(temp_folder) / f"{size_in_kb}-8.txt"
+            _write_document(path, size_in_kb)
+            assert legacy_full_text_from(path) == document_parser._full_text_from(path)
+            legacy_seconds, legacy_peak = _seconds_and_peak_memory(legacy_full_text_from, path, arguments.repeat)
+            current_seconds, current_peak = _seconds_and_peak_memory(
+                document_parser._full_text_from, path, arguments.repeat
+            )
+            print(
+                f"{size_in_kb:>6}KB {legacy_seconds * 1000:>10.2f} {current_seconds * 1000:>10.2f} "
+                f"{legacy_seconds / current_seconds:>7.1f}x "
+                f"{legacy_peak / 1024 / 1024:>10.2f} {current_peak / 1024 / 1024:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Load test for the search and document views comparing servers running the same site, typically one
+with WSGI and one with ASGI.
+
+Start the servers with DEBUG turned off so the debug toolbar does not distort the results, for example
+with:
+
+    GUTENSEARCH_DEBUG=0 python manage.py runserver --noreload 8000
+    GUTENSEARCH_DEBUG=0 uvicorn --port 8001 django_search_example.asgi:application
+
+Then run:
+
+    python -m scripts.load_test http://127.0.0.1:8000 http://127.0.0.1:8001 --concurrency 50
+
+Each client sends its requests one after another using a keep-alive connection, so the number of
+concurrent requests equals ``--concurrency``.
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+import urllib.parse
+from typing import List, NamedTuple
+
+_DEFAULT_CONCURRENCY = 20
+_DEFAULT_DOCUMENT_ID = 1
+_DEFAULT_REQUESTS = 500
+_DEFAULT_SEARCH_TERMS = "whale,love,war,river,sea,king,garden,night"
+
+
+class LoadTestResult(NamedTuple):
+    seconds: float
+    durations: List[float]
+    error_count: int
+
+
+def _paths(search_terms: List[str], document_id: int) -> List[str]:
+    result = [f"/search/?{urllib.parse.urlencode({'search_term': search_term})}" for search_term in search_terms]
+    result.append(f"/document/{document_id}/")
+    return result
+
+
+def _run_client(base_url: str, paths: List[str], request_count: int, durations: List[float], errors: List[str]):
+    parsed_url = urllib.parse.urlsplit(base_url)
+    connection = http.client.HTTPConnection(parsed_url.hostname, parsed_url.port)
+    try:
+        for request_index in range(request_count):
+            path = paths[request_index % len(paths)]
+            start_time = time.perf_counter()
+            try:
+                connection.request("GET", path, headers={"Accept-Encoding": "gzip"})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors.append(f"{path}: HTTP {response.status}")
+            except (OSError, http.client.HTTPException) as error:
+                errors.append(f"{path}: {error}")
+                connection.close()
+                connection = http.client.HTTPConnection(parsed_url.hostname, parsed_url.port)
+            durations.append(time.perf_counter() - start_time)
+    finally:
+        connection.close()
+
+
+def load_test(base_url: str, paths: List[str], concurrency: int, request_count: int) -> LoadTestResult:
+    durations = []
+    errors = []
+    requests_per_client = max(1, request_count // concurrency)
+    clients = [
+        threading.Thread(target=_run_client, args=(base_url, paths, requests_per_client, durations, errors))
+        for _ in range(concurrency)
+    ]
+    start_time = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    return LoadTestResult(time.perf_counter() - start_time, durations, len(errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("base_urls", metavar="URL", nargs="+", help="base URL of a server to test")
+    parser.add_argument(
+        "--concurrency",
+        "-c",
+        default=_DEFAULT_CONCURRENCY,
+        type=int,
+        help="number of concurrent clients; default: %(default)d",
+    )
+    parser.add_argument(
+        "--document-id", "-d", default=_DEFAULT_DOCUMENT_ID, type=int, help="document to view; default: %(default)d"
+    )
+    parser.add_argument(
+        "--requests", "-n", default=_DEFAULT_REQUESTS, type=int, help="total number of requests; default: %(default)d"
+    )
+    parser.add_argument(
+        "--search-terms",
+        "-s",
+        default=_DEFAULT_SEARCH_TERMS,
+        metavar="LIST",
+        help="comma separated list of terms to search for; default: %(default)s",
+    )
+    arguments = parser.parse_args()
+    paths = _paths(arguments.search_terms.split(","), arguments.document_id)
+    print(f"{'server':<30} {'requests/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for base_url in arguments.base_urls:
+        result = load_test(base_url, paths, arguments.concurrency, arguments.requests)
+        percentiles = statistics.quantiles(result.durations, n=100) if len(result.durations) >= 2 else [0.0] * 99
+        print(
+            f"{base_url:<30} {len(result.durations) / result.seconds:>10.1f} "
+            f"{percentiles[49] * 1000:>8.1f} {percentiles[94] * 1000:>8.1f} {percentiles[98] * 1000:>8.1f} "
+            f"{result.error_count:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
 #!/bin/sh
 MIRROR=aleph.gutenberg.org
-rsync --include "*/" --include "*.htm" --include "*.txt" --exclude "*"  -av --del ${MIRROR}::gutenberg gutenberg
+# --omit-dir-times keeps the modification time rsync gives local directories when it replaces files in them,
+# which "gutenlader --manifest" relies on to find changed directories.
+rsync --include "*/" --include "*.htm" --include "*.txt" --exclude "*"  -av --omit-dir-times --del ${MIRROR}::gutenberg gutenberg
@@ -0,0 +1,116 @@
+import hashlib
+import zlib
+from pathlib import Path
+
+from gutensearch import gutenberg
+from gutensearch.gutenberg import (
+    MAX_INTRO_LINES,
+    WARNING_CANNOT_DETERMINE_ENCODING,
+    WARNING_MAPPING_BROKEN_ENCODING,
+    WARNING_NO_END_MARKER_FOUND,
+    WARNING_NO_START_MARKER_FOUND,
+    DocumentParser,
+)
+
+_DATA_FOLDER = Path(__file__).parent / "data"
+_HTML_PATH = _DATA_FOLDER / "2701-h.htm"
+
+
+def _warning_codes(parse_result: gutenberg.ParseResult):
+    return [warning.code for warning in parse_result.warnings]
+
+
+def test_can_parse_document():
+    parse_result = DocumentParser(0).parse(2701, _DATA_FOLDER / "2701.txt", _HTML_PATH)
+    assert parse_result.error is None
+    assert _warning_codes(parse_result) == []
+    document = parse_result.document
+    assert document.title == "Moby Dick"
+    assert document.authors == "Herman Melville"
+    assert document.language_code == "en"
+    assert document.text.startswith("Call me Ishmael.")
+    assert document.text.endswith("The café was closed.")
+    assert "\r" not in document.text
+    assert "START OF" not in document.text
+    assert "END OF" not in document.text
+    assert document.passage_ends == [len(document.text)]
+    assert zlib.decompress(document.compressed_html).decode("utf-8") == _HTML_PATH.read_text("utf-8").strip()
+
+
+def test_can_parse_document_without_end_marker():
+    parse_result = DocumentParser(0).parse(2229, _DATA_FOLDER / "2229-0.txt", _HTML_PATH)
+    assert _warning_codes(parse_result) == [WARNING_NO_END_MARKER_FOUND]
+    document = parse_result.document
+    assert document.title == "Faust"
+    assert document.language_code == "de"
+    assert document.text.startswith("Habe nun, ach! Philosophie,\n")
+    assert document.text.endswith("mit heißem Bemüh’n.")
+
+
+def test_can_parse_document_without_markers():
+    parse_result = DocumentParser(0).parse(1, _DATA_FOLDER / "no_markers.txt", _HTML_PATH)
+    assert _warning_codes(parse_result) == [WARNING_CANNOT_DETERMINE_ENCODING, WARNING_NO_START_MARKER_FOUND]
+    document = parse_result.document
+    assert document.title == "Copyright Notice"
+    assert document.language_code == gutenberg.UNKNOWN_LANGUAGE_CODE
+    assert document.text == ""
+
+
+def test_can_skip_too_long_document():
+    parse_result = DocumentParser(10).parse(2701, _DATA_FOLDER / "2701.txt", _HTML_PATH)
+    assert parse_result.document is None
+    assert _warning_codes(parse_result) == [gutenberg.WARNING_FILE_TOO_LARGE]
+
+
+def test_can_report_missing_document_file(tmp_path):
+    parse_result = DocumentParser(0).parse(2, tmp_path / "2.txt", _HTML_PATH)
+    assert parse_result.document is None
+    assert "2.txt" in parse_result.error
+
+
+def test_can_map_broken_encoding(tmp_path):
+    text_path = tmp_path / "3.txt"
+    text_path.write_bytes(
+        "Character set encoding: ISO Latin-1\n*** START OF THE PROJECT GUTENBERG EBOOK\nÄ\n".encode("latin-1")
+    )
+    parse_result = DocumentParser(0).parse(3, text_path, _HTML_PATH)
+    assert _warning_codes(parse_result) == [WARNING_MAPPING_BROKEN_ENCODING, WARNING_NO_END_MARKER_FOUND]
+    assert parse_result.document.text == "Ä"
+
+
+def test_can_decode_across_chunk_boundaries(tmp_path, monkeypatch):
+    # Place a "\r\n" and a multi byte character on the boundaries of the chunks the file is read in.
+    byte_chunk_size = 8192
+    intro = "Character set encoding: UTF-8\r\n*** START OF THE PROJECT GUTENBERG EBOOK\r\n"
+    first_line = "a" * (byte_chunk_size - len(intro) - 1) + "\r\n"
+    second_line = "b" * (byte_chunk_size - 1) + "ß\r\n"
+    text_path = tmp_path / "4.txt"
+    text_path.write_bytes((intro + first_line + second_line + "\r\nend").encode("utf-8"))
+    assert text_path.read_bytes()[byte_chunk_size - 1 : byte_chunk_size + 1] == b"\r\n"
+    expected_text = "a" * (len(first_line) - 2) + "\n" + "b" * (byte_chunk_size - 1) + "ß\n\nend"
+    for decode_buffer_size in (1, 3, 1024):
+        monkeypatch.setattr(gutenberg, "_DECODE_BUFFER_SIZE", decode_buffer_size)
+        parse_result = DocumentParser(0).parse(4, text_path, _HTML_PATH)
+        assert parse_result.document.text == expected_text
+
+
+def test_can_limit_intro_lines():
+    full_text = "\n".join(f"line {line_number}" for line_number in range(MAX_INTRO_LINES + 10))
+    intro_lines, text = DocumentParser(0)._intro_lines_and_text(Path("5.txt"), full_text)
+    assert len(intro_lines) == MAX_INTRO_LINES
+    assert intro_lines[0] == "line 0"
+    assert text == ""
+
+
+def test_can_hash_document_files_while_parsing():
+    text_path = _DATA_FOLDER / "2701.txt"
+    parse_result = DocumentParser(0, is_hashing=True).parse(2701, text_path, _HTML_PATH)
+    expected_content_hash = hashlib.sha256(text_path.read_bytes() + _HTML_PATH.read_bytes()).hexdigest()
+    assert parse_result.document.content_hash == expected_content_hash
+    assert DocumentParser(0).parse(2701, text_path, _HTML_PATH).document.content_hash == ""
+
+
+def test_can_report_missing_html_file(tmp_path):
+    parse_result = DocumentParser(0, is_hashing=True).parse(2701, _DATA_FOLDER / "2701.txt", tmp_path / "2701-h.htm")
+    assert parse_result.document is None
+    assert "2701-h.htm" in parse_result.error
@@ -0,0 +1,41 @@
+import threading
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from gutensearch import instrumentation
+from gutensearch.instrumentation import MetricsRegistry, QueryMetricsMiddleware
+
+
+def _slow_search_view(request):
+    instrumentation._current_request_metrics.get().add_query("default", "select 1", None, 1.0)
+    return HttpResponse()
+
+
+def _wait_for_explained_slow_searches():
+    instrumentation._explain_executor.submit(lambda: None).result(timeout=5)
+
+
+@override_settings(GUTENSEARCH_SLOW_SEARCH_THRESHOLD_IN_MS=0)
+def test_can_return_slow_search_before_explaining_it():
+    may_explain = threading.Event()
+
+    def blocking_explained_plan(alias, sql, params):
+        assert may_explain.wait(timeout=5)
+        return f"plan of {sql}"
+
+    request = RequestFactory().get("/search/", {"search_term": "whale"})
+    request.resolver_match = mock.Mock(url_name="search_result")
+    registry = MetricsRegistry()
+    with mock.patch.object(instrumentation, "metrics_registry", registry), mock.patch.object(
+        instrumentation, "explained_plan", blocking_explained_plan
+    ):
+        response = QueryMetricsMiddleware(_slow_search_view)(request)
+        assert response.status_code == 200
+        assert registry.slow_searches() == []
+        may_explain.set()
+        _wait_for_explained_slow_searches()
+    [slow_search] = registry.slow_searches()
+    assert slow_search.search_term == "whale"
+    assert slow_search.plan == "plan of select 1"
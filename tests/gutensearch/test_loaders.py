@@ -0,0 +1,80 @@
+import io
+
+import pytest
+
+from gutensearch.loaders import LOADER_CLASSES, CopyLoader, _copy_value, _CopyRowsStream
+from gutensearch.models import Document, DocumentHtml
+
+_AWKWARD_TEXT = "back\\slash\ttab\nnewline\r\ncarriage return \\N ümlaut"
+
+
+@pytest.mark.parametrize(
+    "value, expected_copy_value",
+    [
+        (None, b"\\N"),
+        ("", b""),
+        ("back\\slash", b"back\\\\slash"),
+        ("a\tb", b"a\\tb"),
+        ("a\nb", b"a\\nb"),
+        ("a\rb", b"a\\rb"),
+        ("\\N", b"\\\\N"),
+        ("ümlaut", "ümlaut".encode("utf-8")),
+        (b"\x00\xff", b"\\\\x00ff"),
+        (bytearray(b"\x01"), b"\\\\x01"),
+        (memoryview(b"\x02"), b"\\\\x02"),
+        (b"", b"\\\\x"),
+        (True, b"t"),
+        (False, b"f"),
+        (17, b"17"),
+    ],
+)
+def test_can_convert_copy_value(value, expected_copy_value):
+    assert _copy_value(value) == expected_copy_value
+
+
+def test_can_stream_rows_with_empty_chunks():
+    rows = [b"", b"first\n", b"", b"", b"second row\n", b""]
+    stream = _CopyRowsStream(iter(rows))
+    chunks = []
+    buffer = bytearray(4)
+    while True:
+        count = stream.readinto(buffer)
+        if count == 0:
+            break
+        chunks.append(bytes(buffer[:count]))
+    assert b"".join(chunks) == b"first\nsecond row\n"
+    assert max(len(chunk) for chunk in chunks) <= len(buffer)
+    assert _CopyRowsStream(iter([])).readinto(buffer) == 0
+
+
+def test_can_read_rows_stream_as_file():
+    assert io.BufferedReader(_CopyRowsStream(iter([b"a\n", b"", b"b\n"]))).read() == b"a\nb\n"
+
+
+def test_can_build_copy_rows():
+    document_html = DocumentHtml(document_id=1, compressed_html=b"\x78\x9c")
+    rows = list(CopyLoader._copy_rows(DocumentHtml._meta.concrete_fields, [document_html]))
+    assert rows == [b"1\t\\\\x789c\n"]
+
+
+def _document(document_id: int, title: str) -> Document:
+    return Document(id=document_id, title=title, language_code="en", authors=_AWKWARD_TEXT)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("loader_name", sorted(LOADER_CLASSES.keys()))
+def test_can_upsert_awkward_values(loader_name):
+    document_loader = LOADER_CLASSES[loader_name](Document, upsert=True)
+    document_html_loader = LOADER_CLASSES[loader_name](DocumentHtml, upsert=True)
+    document_loader.load([_document(1, "first"), _document(2, "second")])
+    document_html_loader.load([DocumentHtml(document_id=1, compressed_html=b"\x00\\\xff")])
+
+    document_loader.load([_document(2, "changed\t" + _AWKWARD_TEXT), _document(3, "third")])
+    document_html_loader.load([DocumentHtml(document_id=1, compressed_html=b"\\x\n")])
+
+    assert list(Document.objects.order_by("id").values_list("id", "title", "authors")) == [
+        (1, "first", _AWKWARD_TEXT),
+        (2, "changed\t" + _AWKWARD_TEXT, _AWKWARD_TEXT),
+        (3, "third", _AWKWARD_TEXT),
+    ]
+    assert bytes(DocumentHtml.objects.get(document_id=1).compressed_html) == b"\\x\n"
@@ -0,0 +1,40 @@
+import pytest
+
+from gutensearch.models import Document
+from gutensearch.pagination import keyset_page
+from gutensearch.search import SearchMode, documents_matching, update_search_vectors
+
+_PAGE_SIZE = 2
+
+
+@pytest.fixture
+def documents_with_tied_ranks(db):
+    # Documents with the same title and authors get the same rank, which makes them tie across pages.
+    documents = [Document(title="Whale", language_code="en", authors="Herman Melville") for _ in range(5)]
+    documents.append(Document(title="Whale whale", language_code="en", authors="Herman Melville"))
+    documents.append(Document(title="Whale of a time", language_code="en", authors="Someone Else"))
+    Document.objects.bulk_create(documents)
+    document_ids = list(Document.objects.values_list("id", flat=True))
+    update_search_vectors(document_ids)
+    return document_ids
+
+
+@pytest.mark.parametrize("search_mode", list(SearchMode), ids=lambda search_mode: search_mode.value)
+def test_can_page_through_tied_ranks(documents_with_tied_ranks, search_mode):
+    matching_documents = documents_matching("whale", "en", search_mode).only("id")
+    expected_ids = [document.id for document in matching_documents]
+    assert sorted(expected_ids) == sorted(documents_with_tied_ranks)
+
+    forward_pages = []
+    page = keyset_page(matching_documents, "rank", _PAGE_SIZE)
+    forward_pages.append([document.id for document in page.items])
+    while page.next_token is not None:
+        page = keyset_page(matching_documents, "rank", _PAGE_SIZE, after_token=page.next_token)
+        forward_pages.append([document.id for document in page.items])
+    assert [document_id for page_ids in forward_pages for document_id in page_ids] == expected_ids
+
+    backward_pages = [forward_pages[-1]]
+    while page.previous_token is not None:
+        page = keyset_page(matching_documents, "rank", _PAGE_SIZE, before_token=page.previous_token)
+        backward_pages.insert(0, [document.id for document in page.items])
+    assert backward_pages == forward_pages
@@ -0,0 +1,10 @@
+from gutensearch.result_cache import normalized_search_term
+from gutensearch.search import SearchMode
+
+
+def test_can_normalize_fulltext_search_term():
+    assert normalized_search_term("  Moby\tDICK ", SearchMode.FULLTEXT) == "moby dick"
+
+
+def test_can_keep_trigram_search_term():
+    assert normalized_search_term("  Moby\tDICK ", SearchMode.TRIGRAM) == "  Moby\tDICK "
@@ -0,0 +1,75 @@
+from unittest import mock
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.db import OperationalError
+from django.test import override_settings
+
+from gutensearch import routers
+from gutensearch.models import Document
+from gutensearch.routers import read_from_replica
+
+
+@pytest.fixture(autouse=True)
+def _no_unhealthy_replicas():
+    routers._replica_alias_to_retry_time_map.clear()
+    yield
+    routers._replica_alias_to_retry_time_map.clear()
+
+
+@read_from_replica
+async def _read_database_alias_view(request):
+    return Document.objects.all().db
+
+
+def _connections(**alias_to_is_healthy_map):
+    return {
+        alias: mock.Mock(ensure_connection=mock.Mock(side_effect=None if is_healthy else OperationalError("down")))
+        for alias, is_healthy in alias_to_is_healthy_map.items()
+    }
+
+
+@override_settings(GUTENSEARCH_REPLICA_DATABASES=["replica"])
+def test_can_read_from_healthy_replica():
+    with mock.patch.object(routers, "connections", _connections(replica=True)):
+        assert async_to_sync(_read_database_alias_view)(None) == "replica"
+    assert Document.objects.all().db == "default"
+
+
+@override_settings(GUTENSEARCH_REPLICA_DATABASES=["replica", "other_replica"])
+def test_can_skip_unhealthy_replica():
+    # Try the unhealthy replica first, which otherwise happens only for some random orders.
+    with mock.patch.object(routers, "connections", _connections(replica=False, other_replica=True)), mock.patch.object(
+        routers.random, "shuffle"
+    ):
+        for _ in range(3):
+            assert async_to_sync(_read_database_alias_view)(None) == "other_replica"
+    assert list(routers._replica_alias_to_retry_time_map.keys()) == ["replica"]
+
+
+@override_settings(GUTENSEARCH_REPLICA_DATABASES=["replica"])
+def test_can_fall_back_to_default_database_without_healthy_replica():
+    with mock.patch.object(routers, "connections", _connections(replica=False)):
+        assert async_to_sync(_read_database_alias_view)(None) == "default"
+
+
+@override_settings(GUTENSEARCH_REPLICA_DATABASES=["replica"])
+def test_can_skip_replica_with_stale_connection():
+    stale_connection = mock.Mock(health_check_done=False, is_usable=mock.Mock(return_value=False))
+    stale_connection.close.side_effect = lambda: setattr(
+        stale_connection, "ensure_connection", mock.Mock(side_effect=OperationalError("down"))
+    )
+    with mock.patch.object(routers, "connections", {"replica": stale_connection}):
+        assert async_to_sync(_read_database_alias_view)(None) == "default"
+    stale_connection.close.assert_called_once_with()
+    assert list(routers._replica_alias_to_retry_time_map.keys()) == ["replica"]
+
+
+@override_settings(GUTENSEARCH_REPLICA_DATABASES=["replica"])
+def test_can_check_replica_connection_once_per_request():
+    connection = mock.Mock(health_check_done=False, is_usable=mock.Mock(return_value=True))
+    with mock.patch.object(routers, "connections", {"replica": connection}):
+        for _ in range(2):
+            assert async_to_sync(_read_database_alias_view)(None) == "replica"
+    connection.is_usable.assert_called_once_with()
+    connection.close.assert_not_called()
@@ -0,0 +1,68 @@
+import os
+from pathlib import Path
+
+from gutensearch.scanner import scanned_document_files
+
+
+def _write_document_files(folder: Path, document_id: int):
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / f"{document_id}-8.txt").write_text("text", encoding="utf-8")
+    (folder / f"{document_id}-h.htm").write_text("<html></html>", encoding="utf-8")
+
+
+def _touch_directory(folder: Path):
+    # Make sure the change is visible even on file systems with a coarse modification time.
+    mtime_ns = os.stat(folder).st_mtime_ns + 1_000_000_000
+    os.utime(folder, ns=(mtime_ns, mtime_ns))
+
+
+def test_can_scan_document_files(tmp_path):
+    _write_document_files(tmp_path / "1", 1)
+    _write_document_files(tmp_path / "2" / "3", 23)
+    (tmp_path / "1" / "1-0.txt").write_text("ignored", encoding="utf-8")
+    scan_result = scanned_document_files(tmp_path)
+    assert sorted(scan_result.id_to_text_file_map.keys()) == [1, 23]
+    assert sorted(scan_result.id_to_html_file_map.keys()) == [1, 23]
+    assert scan_result.id_to_text_file_map[23].path == tmp_path / "2" / "3" / "23-8.txt"
+    assert scan_result.id_to_text_file_map[23].size == len("text")
+    assert scan_result.directory_count == 4
+
+
+def test_can_rescan_only_changed_directories(tmp_path):
+    base_dir = tmp_path / "gutenberg"
+    manifest_path = tmp_path / "manifest.json"
+    _write_document_files(base_dir / "1", 1)
+    _write_document_files(base_dir / "2", 2)
+    first_scan_result = scanned_document_files(base_dir, manifest_path)
+    assert first_scan_result.changed_directory_count == 3
+
+    unchanged_scan_result = scanned_document_files(base_dir, manifest_path)
+    assert unchanged_scan_result.changed_directory_count == 0
+    assert unchanged_scan_result.id_to_text_file_map == first_scan_result.id_to_text_file_map
+
+    _write_document_files(base_dir / "2", 22)
+    _touch_directory(base_dir / "2")
+    changed_scan_result = scanned_document_files(base_dir, manifest_path)
+    assert changed_scan_result.changed_directory_count == 1
+    assert sorted(changed_scan_result.id_to_text_file_map.keys()) == [1, 2, 22]
+
+
+def test_can_scan_with_broken_manifest(tmp_path):
+    base_dir = tmp_path / "gutenberg"
+    _write_document_files(base_dir / "1", 1)
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text("{broken", encoding="utf-8")
+    scan_result = scanned_document_files(base_dir, manifest_path)
+    assert list(scan_result.id_to_text_file_map.keys()) == [1]
+    assert scanned_document_files(base_dir, manifest_path).changed_directory_count == 0
+
+
+def test_can_scan_with_manifest_that_is_a_directory(tmp_path):
+    base_dir = tmp_path / "gutenberg"
+    _write_document_files(base_dir / "1", 1)
+    manifest_folder = tmp_path / "manifest"
+    manifest_folder.mkdir()
+    scan_result = scanned_document_files(base_dir, manifest_folder)
+    assert list(scan_result.id_to_text_file_map.keys()) == [1]
+    # No temporary manifest is left behind.
+    assert sorted(tmp_path.iterdir()) == [base_dir, manifest_folder]
@@ -0,0 +1,31 @@
+import pytest
+from asgiref.sync import async_to_sync
+
+from gutensearch import search
+from gutensearch.models import Document
+from gutensearch.search import asuggestions_for
+
+
+@pytest.mark.django_db
+def test_can_suggest_titles_with_sharp_s():
+    # Python converts "ß" to "SS" in upper case while PostgreSQL keeps it.
+    Document.objects.bulk_create(
+        [
+            Document(title="Die Straße", language_code="de", authors="Someone"),
+            Document(title="Die Strasse", language_code="de", authors="Someone Else"),
+        ]
+    )
+    assert async_to_sync(asuggestions_for)("die straß") == ["Die Straße"]
+    assert async_to_sync(asuggestions_for)("DIE STRASSE") == ["Die Strasse"]
+
+
+@pytest.mark.django_db
+def test_can_suggest_alphabetically_first_candidates(monkeypatch):
+    monkeypatch.setattr(search, "_SUGGESTION_CANDIDATE_COUNT", 2)
+    Document.objects.bulk_create(
+        [
+            Document(title=title, language_code="en", authors="Someone")
+            for title in ("Moby Dick 3", "Moby Dick 1", "Moby Dick 2")
+        ]
+    )
+    assert async_to_sync(asuggestions_for)("moby") == ["Moby Dick 1", "Moby Dick 2"]
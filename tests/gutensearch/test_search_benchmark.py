@@ -0,0 +1,40 @@
+"""
+Benchmarks for the search strategies on a small synthetic corpus. Run them with:
+
+    pytest tests/gutensearch/test_search_benchmark.py --benchmark-only
+
+To benchmark larger corpora and get rows scanned and index sizes, use ``python manage.py benchmark``.
+"""
+from itertools import cycle
+
+import pytest
+
+from gutensearch.benchmark import PAGE_SIZE, BenchmarkQuery, generate_corpus, search_first_page, zipf_queries
+from gutensearch.search import SearchMode
+
+_DOCUMENT_COUNT = 200
+_QUERY_COUNT = 100
+_WORDS_PER_DOCUMENT = 2000
+
+
+@pytest.fixture
+def corpus(transactional_db):
+    # Generating the corpus truncates tables and analyzes them, so it runs outside of a test transaction.
+    # The transactional_db fixture removes the synthetic documents again after the test.
+    return generate_corpus(_DOCUMENT_COUNT, words_per_document=_WORDS_PER_DOCUMENT)
+
+
+@pytest.mark.parametrize("search_mode", list(SearchMode), ids=lambda search_mode: search_mode.value)
+def test_can_benchmark_search_first_page(benchmark, corpus, search_mode):
+    queries = cycle(zipf_queries(corpus, _QUERY_COUNT))
+    document_ids = benchmark(lambda: search_first_page(next(queries), search_mode))
+    assert len(document_ids) <= PAGE_SIZE
+    assert all(1 <= document_id <= _DOCUMENT_COUNT for document_id in document_ids)
+
+
+@pytest.mark.parametrize("search_mode", list(SearchMode), ids=lambda search_mode: search_mode.value)
+def test_can_find_full_page_for_most_frequent_word(corpus, search_mode):
+    most_frequent_english_word = corpus.language_code_to_vocabulary_map["en"][0]
+    document_ids = search_first_page(BenchmarkQuery(most_frequent_english_word, "en"), search_mode)
+    assert len(document_ids) == PAGE_SIZE
+    assert len(set(document_ids)) == PAGE_SIZE
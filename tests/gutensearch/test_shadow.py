@@ -0,0 +1,57 @@
+import pytest
+from django.db import connection
+
+from gutensearch.models import Document, DocumentHtml, Passage
+from gutensearch.shadow import ShadowTables
+
+_MODELS = [Document, DocumentHtml, Passage]
+
+
+def _table_names():
+    with connection.cursor() as cursor:
+        return set(connection.introspection.table_names(cursor))
+
+
+def _constraints(model):
+    with connection.cursor() as cursor:
+        return connection.introspection.get_constraints(cursor, model._meta.db_table)
+
+
+@pytest.mark.django_db
+def test_can_create_shadow_tables_without_indexes_and_drop_them():
+    shadow_tables = ShadowTables(_MODELS)
+    shadow_tables.create()
+    shadow_passage_model = shadow_tables.shadow_model(Passage)
+    assert shadow_passage_model._meta.db_table in _table_names()
+    assert [
+        name for name, constraint in _constraints(shadow_passage_model).items() if not constraint["primary_key"]
+    ] == []
+    shadow_tables.drop()
+    assert not {shadow_tables.shadow_model(model)._meta.db_table for model in _MODELS} & _table_names()
+
+
+@pytest.mark.django_db
+def test_can_swap_in_shadow_tables():
+    Document.objects.create(title="Old", language_code="en", authors="Someone")
+    shadow_tables = ShadowTables(_MODELS)
+    shadow_tables.create()
+    shadow_tables.shadow_model(Document).objects.create(id=2, title="New", language_code="en", authors="Someone")
+    shadow_tables.shadow_model(DocumentHtml).objects.create(document_id=2, compressed_html=b"")
+    shadow_tables.shadow_model(Passage).objects.create(document_id=2, ordinal=0, language_code="en", text="New text")
+    shadow_tables.build_indexes()
+    shadow_tables.analyze()
+    shadow_tables.swap()
+
+    assert list(Document.objects.values_list("title", flat=True)) == ["New"]
+    assert list(Passage.objects.values_list("document__title", "text")) == [("New", "New text")]
+    assert not {shadow_tables.shadow_model(model)._meta.db_table for model in _MODELS} & _table_names()
+    passage_constraints = _constraints(Passage)
+    assert "passage_language_search_idx" in passage_constraints
+    assert any(
+        constraint["foreign_key"] == (Document._meta.db_table, "id") for constraint in passage_constraints.values()
+    )
+    assert any(
+        constraint["index"] and constraint["columns"] == ["document_id"] for constraint in passage_constraints.values()
+    )
+    # The renamed sequence still provides ids.
+    assert Document.objects.create(title="Newer", language_code="en", authors="Someone").id > 0
@@ -0,0 +1,80 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.http import Http404
+from django.test import RequestFactory, override_settings
+
+from gutensearch.views import _accepts_encoding, _encoding_to_quality_map, _preferred_encoding, metrics_view
+
+
+def test_can_parse_encoding_qualities():
+    assert _encoding_to_quality_map("") == {}
+    assert _encoding_to_quality_map("gzip, Deflate;q=0.5 , br ; q=0") == {"gzip": 1.0, "deflate": 0.5, "br": 0.0}
+    assert _encoding_to_quality_map("gzip;q=broken") == {"gzip": 0.0}
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, encoding, expected_accepts",
+    [
+        ("gzip, deflate", "deflate", True),
+        ("gzip, deflate;q=0", "deflate", False),
+        ("gzip, deflate;q=0.0", "deflate", False),
+        ("gzip, deflate;q=0.001", "deflate", True),
+        ("gzip", "deflate", False),
+        ("*", "deflate", True),
+        ("*;q=0", "gzip", False),
+        ("*, deflate;q=0", "deflate", False),
+        ("*;q=0, gzip", "gzip", True),
+        ("", "gzip", False),
+    ],
+)
+def test_can_tell_accepted_encodings(accept_encoding, encoding, expected_accepts):
+    assert _accepts_encoding(_encoding_to_quality_map(accept_encoding), encoding) == expected_accepts
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected_encoding",
+    [
+        ("gzip, deflate", "gzip"),
+        ("deflate, gzip", "gzip"),
+        ("gzip;q=0.5, deflate", "deflate"),
+        ("gzip, deflate;q=0.5", "gzip"),
+        ("deflate", "deflate"),
+        ("*", "gzip"),
+        ("*, gzip;q=0.5", "deflate"),
+        ("br", None),
+        ("gzip;q=0, deflate;q=0", None),
+        ("", None),
+    ],
+)
+def test_can_prefer_encoding_with_highest_quality(accept_encoding, expected_encoding):
+    assert _preferred_encoding(_encoding_to_quality_map(accept_encoding)) == expected_encoding
+
+
+def _metrics_request(**headers):
+    return RequestFactory().get("/metrics/", REMOTE_ADDR="127.0.0.1", headers=headers)
+
+
+@override_settings(GUTENSEARCH_METRICS_TOKEN=None)
+def test_can_disable_metrics_without_token():
+    with pytest.raises(Http404):
+        async_to_sync(metrics_view)(_metrics_request(Authorization="Bearer "))
+
+
+@override_settings(GUTENSEARCH_METRICS_TOKEN="secret")
+def test_can_read_metrics_with_token():
+    response = async_to_sync(metrics_view)(_metrics_request(Authorization="Bearer secret"))
+    assert response.status_code == 200
+
+
+@override_settings(GUTENSEARCH_METRICS_TOKEN="secret")
+@pytest.mark.parametrize("authorization", ["", "Bearer", "Bearer wrong", "secret"])
+def test_can_reject_metrics_request_without_matching_token(authorization):
+    with pytest.raises(Http404):
+        async_to_sync(metrics_view)(_metrics_request(Authorization=authorization))
+
+
+@override_settings(GUTENSEARCH_METRICS_TOKEN="secret")
+def test_can_reject_metrics_request_from_other_address():
+    request = RequestFactory().get("/metrics/", REMOTE_ADDR="192.0.2.1", headers={"Authorization": "Bearer secret"})
+    with pytest.raises(Http404):
+        async_to_sync(metrics_view)(request)